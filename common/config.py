@@ -1,16 +1,75 @@
 import urllib
 from dotenv import load_dotenv
 from pathlib import Path
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+import atexit
 import os
+import queue
 import logging
 import logging.config
 import logging.handlers
 from urllib.parse import quote_plus
 
-load_dotenv()
-
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+@dataclass(frozen=True)
+class Settings:
+    """Environment-derived settings, read once per process"""
+    log_path: Optional[str]
+    log_level: str
+    fish_secret: Optional[str]
+    fish_model_id: Optional[str]
+    discord_token: Optional[str]
+    wavelink_password: Optional[str]
+    db_cfg: dict
+    database_url: str
+    openai_api_key: Optional[str]
+    telegram_token: Optional[str]
+    admin_user_id: Optional[str]
+    telegram_offset_path: str
+    semantic_cache_path: str
+    openai_batch_min_tasks: int
+
+_LOADED = False
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load .env once and snapshot every variable the app reads"""
+    global _LOADED
+    if not _LOADED:
+        # An explicit path skips find_dotenv()'s stack inspection and directory walk
+        load_dotenv(BASE_DIR / '.env')
+        _LOADED = True
+
+    db_cfg = {
+        'db_user': quote_plus(os.getenv('DB_USER', 'taskuser')),
+        'db_password': quote_plus(os.getenv('DB_PASSWORD', '')),
+        'db_name': os.getenv('DB_NAME', 'task_manager'),
+        'db_host': '127.0.0.1',
+        'db_port': '5432'
+    }
+
+    return Settings(
+        log_path=os.environ.get("LOG_PATH"),
+        log_level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+        fish_secret=os.environ.get('FISH_API'),
+        fish_model_id=os.environ.get('FISH_MODEL_ID'),
+        discord_token=os.environ.get("DISCORD_TOKEN"),
+        wavelink_password=os.environ.get("WAVEPASS"),
+        db_cfg=db_cfg,
+        database_url="postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}".format(**db_cfg),
+        openai_api_key=os.getenv('OPENAI_API_KEY'),
+        telegram_token=os.getenv('TELEGRAM_BOT_TOKEN'),
+        admin_user_id=os.getenv('ADMIN_USER_ID'),
+        telegram_offset_path=os.getenv('TELEGRAM_OFFSET_PATH', str(BASE_DIR / '.telegram_offset')),
+        semantic_cache_path=os.getenv('SEMANTIC_CACHE_PATH', str(BASE_DIR / 'semantic_cache.sqlite3')),
+        openai_batch_min_tasks=int(os.getenv('OPENAI_BATCH_MIN_TASKS', '5')),
+    )
+
+settings = get_settings()
+
 LOGGING_CONFIG = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -24,14 +83,14 @@ LOGGING_CONFIG = {
     },
     'handlers': {
         'console': {
-            'level': 'INFO',
+            'level': settings.log_level,
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
         'main_file': {
-            'level': 'INFO',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': os.environ.get("LOG_PATH"),
+            'level': settings.log_level,
+            'class': 'common.log_ext.FastRotatingFileHandler',
+            'filename': settings.log_path,
             'formatter': 'verbose',
             'encoding': 'utf-8',
             'maxBytes': 10*1024*1024,
@@ -41,7 +100,7 @@ LOGGING_CONFIG = {
     'loggers': {
         '': {
             'handlers': ['console', 'main_file'],
-            'level': 'INFO',
+            'level': settings.log_level,  # LOG_LEVEL=DEBUG shows per-request cache hits
             'propagate': False,
         },
     },
@@ -49,20 +108,27 @@ LOGGING_CONFIG = {
 
 logging.config.dictConfig(LOGGING_CONFIG)
 
-FISH_SECRET = os.environ.get('FISH_API')
-FISH_MODEL_ID = os.environ.get('FISH_MODEL_ID')
+# Hand records to a background listener so callers never block on handler I/O
+_log_queue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+_log_listener = logging.handlers.QueueListener(
+    _log_queue, *_root_logger.handlers, respect_handler_level=True
+)
+_root_logger.handlers = [logging.handlers.QueueHandler(_log_queue)]
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
-DISCORD_TOKEN = os.environ.get("DISCORD_TOKEN")
+FISH_SECRET = settings.fish_secret
+FISH_MODEL_ID = settings.fish_model_id
 
-DB_CFG = {
-    'db_user': quote_plus(os.getenv('DB_USER', 'taskuser')),
-    'db_password': quote_plus(os.getenv('DB_PASSWORD', '')),
-    'db_name': os.getenv('DB_NAME', 'task_manager'),
-    'db_host': '127.0.0.1',
-    'db_port': '5432'
-}
+DISCORD_TOKEN = settings.discord_token
+WAVELINK_PASSWORD = settings.wavelink_password
+
+DB_CFG = settings.db_cfg
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+OPENAI_API_KEY = settings.openai_api_key
+OPENAI_BATCH_MIN_TASKS = settings.openai_batch_min_tasks  # 0 disables the Batch API path
 
-TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
-ADMIN_USER_ID = os.getenv('ADMIN_USER_ID')
\ No newline at end of file
+TELEGRAM_BOT_TOKEN = settings.telegram_token
+ADMIN_USER_ID = settings.admin_user_id
+TELEGRAM_OFFSET_PATH = settings.telegram_offset_path  # Next update id, kept across restarts
\ No newline at end of file
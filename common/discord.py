@@ -1,17 +1,55 @@
 import tempfile
-import os
+import sys
 import logging
 import asyncio
+import time
+from collections import deque
 
 from common.fish import FishClient
-from common.config import DISCORD_TOKEN
+from common.config import DISCORD_TOKEN, WAVELINK_PASSWORD
 
 import discord
 from discord.ext import commands
 import wavelink
+from cachetools import TTLCache
 
 logger = logging.getLogger()
 
+# uvloop is a faster drop-in event loop for this socket-heavy bot (not available on Windows)
+if sys.platform != 'win32':
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+# Keep the voice connection warm this long after the last clip finishes
+IDLE_DISCONNECT_SECONDS = 45
+
+TTS_PREFIX = '!dex'
+_PREFIX_LEN = len(TTS_PREFIX)
+
+# At most this many Fish TTS downloads run at once
+_FISH_SEM = asyncio.Semaphore(4)
+
+# Per-user rate limit for !dex
+RATE_LIMIT_MESSAGES = 5
+RATE_LIMIT_WINDOW = 10  # seconds
+RATE_LIMIT_USERS = 10_000
+# user_id -> request timestamps; an entry expires once its newest request leaves the window
+_recent_requests = TTLCache(maxsize=RATE_LIMIT_USERS, ttl=RATE_LIMIT_WINDOW)
+
+def is_rate_limited(user_id: int) -> bool:
+    """Sliding-window limit; records the request when it is allowed"""
+    now = time.monotonic()
+    stamps = _recent_requests.get(user_id) or deque()
+    while stamps and now - stamps[0] > RATE_LIMIT_WINDOW:
+        stamps.popleft()
+    
+    if len(stamps) >= RATE_LIMIT_MESSAGES:
+        return True
+    
+    stamps.append(now)
+    _recent_requests[user_id] = stamps  # Re-inserting restarts the expiry
+    return False
+
 class TTSBot(commands.Bot):
     def __init__(self):
         super().__init__(
@@ -19,6 +57,29 @@ class TTSBot(commands.Bot):
             intents=discord.Intents.all()
         )
         self.fish = FishClient()
+        self.idle_tasks = {}  # guild_id -> pending idle-disconnect task
+        
+    def cancel_idle_disconnect(self, guild_id: int):
+        """Keep the player connected because new audio is on its way"""
+        task = self.idle_tasks.pop(guild_id, None)
+        if task:
+            task.cancel()
+    
+    def schedule_idle_disconnect(self, player: wavelink.Player):
+        """Disconnect the player only if it stays idle for a while"""
+        guild_id = player.guild.id
+        self.cancel_idle_disconnect(guild_id)
+        self.idle_tasks[guild_id] = asyncio.create_task(self._idle_disconnect(player, guild_id))
+    
+    async def _idle_disconnect(self, player: wavelink.Player, guild_id: int):
+        try:
+            await asyncio.sleep(IDLE_DISCONNECT_SECONDS)
+            if not player.playing and not player.queue:
+                logger.info(f"Player idle for {IDLE_DISCONNECT_SECONDS}s, disconnecting")
+                await player.disconnect()
+        finally:
+            if self.idle_tasks.get(guild_id) is asyncio.current_task():
+                del self.idle_tasks[guild_id]
         
     async def setup_hook(self):
         """Initialize Wavelink connection when bot starts"""
@@ -26,7 +87,7 @@ class TTSBot(commands.Bot):
             # Connect to local Lavalink server
             node = wavelink.Node(
                 uri='http://localhost:2333', 
-                password=os.environ.get("WAVEPASS")
+                password=WAVELINK_PASSWORD
             )
             await wavelink.Pool.connect(node=node)
             logger.info("Connected to Lavalink server!")
@@ -47,18 +108,22 @@ async def on_message(message):
     if message.author == bot.user:
         return
 
-    if message.content and message.content.startswith('!dex'):
-        await speak_message_hq(message)
+    content = message.content
+    if content and content.startswith(TTS_PREFIX) and (
+        len(content) == _PREFIX_LEN or content[_PREFIX_LEN].isspace()
+    ):
+        if is_rate_limited(message.author.id):
+            await message.reply("Slow down! Try again in a few seconds.")
+            return
+        await speak_message_hq(message, content[_PREFIX_LEN:].strip())
         return  # Don't process as command
 
     # Process other commands
     await bot.process_commands(message)
 
-async def speak_message_hq(message):
+async def speak_message_hq(message, text_to_speak: str):
     """High-quality TTS using Wavelink/Lavalink"""
     try:
-        # Extract text after !dex command
-        text_to_speak = message.content.replace('!dex', '').strip()
         if not text_to_speak:
             await message.reply("Please provide text to speak! Example: `!dex Hello world`")
             return
@@ -72,9 +137,11 @@ async def speak_message_hq(message):
         
         # Generate TTS audio file
         logger.info(f"Generating TTS for: '{text_to_speak}'")
-        audio_file = bot.fish.text_to_mp3(text_to_speak)
+        async with _FISH_SEM:
+            audio_file = await bot.fish.text_to_mp3_async(text_to_speak)
         
-        # Get or create Wavelink player for this guild
+        # Reuse the guild's player while it is still connected
+        bot.cancel_idle_disconnect(message.guild.id)
         player: wavelink.Player = message.guild.voice_client
         if not player:
             player = await voice_channel.connect(cls=wavelink.Player)
@@ -84,28 +151,33 @@ async def speak_message_hq(message):
         # Create track from local file and play with high quality
         track = await wavelink.LocalTrack.search(audio_file)
         if track:
-            await player.play(track[0])  # LocalTrack.search returns a list
+            # LocalTrack.search returns a list; queue behind any clip still playing
+            if player.playing:
+                player.queue.put(track[0])
+                logger.info(f"Queued TTS audio: {audio_file}")
+            else:
+                await player.play(track[0])
+                logger.info(f"Playing TTS audio: {audio_file}")
             await message.add_reaction("🔊")  # React to show it's playing
-            logger.info(f"Playing TTS audio: {audio_file}")
         else:
             await message.reply("Failed to load audio file for playback")
             
     except wavelink.NodeException:
         logger.error("Lavalink connection failed - falling back to regular Discord audio")
-        await speak_message_fallback(message)
+        await speak_message_fallback(message, text_to_speak)
     except Exception as e:
         logger.error(f"Error in speak_message_hq: {e}")
         # If wavelink fails, try fallback
         if "No nodes are currently assigned" in str(e):
             logger.info("Falling back to regular Discord audio")
-            await speak_message_fallback(message)
+            await speak_message_fallback(message, text_to_speak)
         else:
             await message.reply(f"Error playing TTS: {e}")
 
-async def speak_message_fallback(message):
+async def speak_message_fallback(message, text_to_speak: str):
     """Fallback to regular Discord audio if Lavalink fails"""
-    text_to_speak = message.content.replace('!dex', '').strip()
-    audio_file = bot.fish.text_to_mp3(text_to_speak)
+    async with _FISH_SEM:
+        audio_file = await bot.fish.text_to_mp3_async(text_to_speak)
 
     if message.author.voice:
         vc = await message.author.voice.channel.connect()
@@ -117,12 +189,14 @@ async def speak_message_fallback(message):
             options='-ar 48000 -ac 2 -b:a 256k'
         )
         
-        vc.play(source)
+        # The after-callback runs on the voice thread, so hop back to the loop
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        vc.play(source, after=lambda error: loop.call_soon_threadsafe(done.set))
         await message.add_reaction("🔊")
         
         # Wait for playback to finish
-        while vc.is_playing():
-            await asyncio.sleep(1)
+        await done.wait()
         await vc.disconnect()
 
 @bot.command(name='join')
@@ -176,11 +250,15 @@ async def on_wavelink_track_start(payload: wavelink.TrackStartEventPayload):
 async def on_wavelink_track_end(payload: wavelink.TrackEndEventPayload):
     logger.info(f"Track ended: {payload.track.title}")
     
-    # Auto-disconnect after TTS finishes (optional)
     player = payload.player
-    if player and not player.queue:  # No more tracks in queue
-        await asyncio.sleep(2)  # Brief pause
-        await player.disconnect()
+    if not player:
+        return
+    
+    if player.queue:
+        await player.play(player.queue.get())
+    else:
+        # Stay connected for follow-up messages instead of re-handshaking
+        bot.schedule_idle_disconnect(player)
 
 if __name__ == '__main__':
     try:
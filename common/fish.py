@@ -1,39 +1,43 @@
 import logging
+import asyncio
 import requests
-from datetime import datetime
-import os
+from functools import lru_cache
 
+from common import tts_cache
 from common.config import FISH_SECRET, FISH_MODEL_ID
 
 from fish_audio_sdk import Session, TTSRequest
 
 logger = logging.getLogger()
 
+# Coalesce the SDK's small streamed chunks into few large write() calls
+WRITE_BUFFER_SIZE = 1 << 20
+
+@lru_cache(maxsize=2048)
+def _utf8_len(text: str) -> int:
+    """Billable byte count of text, memoized for frequently repeated phrases"""
+    return len(text.encode('utf-8'))
+
 class FishClient:
 
     def __init__(self):
         self.session = Session(FISH_SECRET)
         self.cost_per_million_bytes = 15.00
-        
-        # Ensure media directory exists
-        os.makedirs('media', exist_ok=True)
     
     def calculate_cost(self, text: str):
-        bytes_count = len(text.encode('utf-8'))
+        bytes_count = _utf8_len(text)
         cost = (bytes_count / 1_000_000) * self.cost_per_million_bytes
         return bytes_count, cost
 
-    def text_to_mp3_with_cost(self, text: str):
-        """Generate TTS and return file path with cost"""
-        logger.info(f"Attempting TTS")
-        
-        bytes_used, cost = self.calculate_cost(text)
-        
-        logger.info(f"TTS Request - Text: '{text[:50]}...' | Bytes: {bytes_used:,} | Cost: ${cost:.6f}")
-        
-        file_path = f'media/{text[:5]}_{datetime.now().timestamp()}.mp3'
+    def cache_path(self, text: str) -> str:
+        """Cache location for the clip of text spoken by the configured model"""
+        return tts_cache.cache_path(text, FISH_MODEL_ID)
 
-        with open(file_path, 'wb') as f:
+    def _synthesize(self, text: str, file_path: str):
+        """Stream the Fish TTS clip for text into file_path"""
+        logger.debug("Attempting TTS")
+        
+        with open(file_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
             for chunk in self.session.tts(
                 TTSRequest(
                     reference_id = FISH_MODEL_ID,
@@ -42,6 +46,29 @@ class FishClient:
             ):
                 f.write(chunk)
 
+    def text_to_mp3_with_cost(self, text: str):
+        """Generate TTS (or reuse a cached clip) and return file path with cost"""
+        file_path, synthesized = tts_cache.get_or_synth(text, self._synthesize, FISH_MODEL_ID)
+        if not synthesized:
+            return file_path, 0.0
+        
+        bytes_used, cost = self.calculate_cost(text)
+        
+        logger.info(f"TTS Request - Text: '{text[:50]}...' | Bytes: {bytes_used:,} | Cost: ${cost:.6f}")
         logger.info(f"Successfully wrote audio to {file_path}")
         
-        return file_path, cost
\ No newline at end of file
+        return file_path, cost
+    
+    def prebuild_mp3_with_cost(self, text: str):
+        """Synthesize a canned reply into the static clip store unless it is already there"""
+        file_path, synthesized = tts_cache.prebuild(text, self._synthesize, FISH_MODEL_ID)
+        return file_path, self.calculate_cost(text)[1] if synthesized else 0.0
+    
+    def text_to_mp3(self, text: str) -> str:
+        """Generate TTS and return file path"""
+        file_path, _ = self.text_to_mp3_with_cost(text)
+        return file_path
+    
+    async def text_to_mp3_async(self, text: str) -> str:
+        """Generate TTS in a worker thread so the event loop keeps running"""
+        return await asyncio.to_thread(self.text_to_mp3, text)
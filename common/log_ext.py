@@ -0,0 +1,21 @@
+import logging.handlers
+
+class FastRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that skips the rollover probe while far below maxBytes"""
+
+    # Records shorter than this can never push a file under the margin past maxBytes
+    size_margin = 4096
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+
+        if self.stream is None:
+            self.stream = self._open()
+
+        # The base implementation formats every record a second time just to
+        # measure it; only pay that cost when we're close to the limit
+        if self.stream.tell() < self.maxBytes - self.size_margin:
+            return False
+
+        return super().shouldRollover(record)
@@ -1,213 +1,731 @@
 import os
 import logging
 import json
-from typing import List, Dict, Any
+import orjson
+import threading
+import hashlib
+from concurrent.futures import Future
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional
 
-from common.config import OPENAI_API_KEY
+from common.config import settings
+from common.semantic_cache import SemanticCache, ExactCache
 
 from openai import OpenAI
+import httpx
+import numpy as np
 
 logger = logging.getLogger()
 
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_SIZE = 10_000
+SIMILARITY_THRESHOLD = 0.7
+SIMILARITY_TOP_K = 5
+
+# Cap in-flight OpenAI requests across all threads to stay clear of rate limits
+_OAI_SEM = threading.BoundedSemaphore(8)
+
+# Priority = leverage + control + urgency, each capped at its maximum points
+PRIORITY_COMPONENTS = {"leverage": 40, "control": 30, "urgency": 30}
+DEFAULT_PRIORITY_COMPONENTS = {"leverage": 20, "control": 15, "urgency": 15}
+
+# Batch API jobs are billed at half the synchronous price
+BATCH_DISCOUNT = 0.5
+BATCH_FAILED_STATUSES = ("failed", "expired", "cancelling", "cancelled")
+
+class BatchFailedError(RuntimeError):
+    """A Batch API job ended without producing results"""
+
+_SYS_PARSE = """
+You are a surgical task decomposition engine. Parse the user's brain dump into clean, actionable tasks.
+
+Extract distinct tasks and return them as a JSON object {"items": [...]} where the items array has this structure:
+[
+    {
+        "content": "Clear description of the task",
+        "category": "Work/Home/Health/Social/Finance/Learning/Misc",
+        "priority_hints": "Any urgency or importance clues",
+        "estimated_complexity": "low/medium/high"
+    }
+]
+
+Rules:
+- Each task should be one clear objective
+- Don't over-segment - keep related sub-tasks together
+- Extract the essence, not the exact wording
+- If something is vague, make it concrete
+"""
+
+_SYS_DECOMPOSE = """
+You are a micro-unit decomposition specialist. Break down ONLY complex tasks that genuinely need multiple steps.
+
+Return a JSON object {"items": [...]} where the items array has this structure:
+[
+    {
+        "description": "Specific, actionable micro-unit",
+        "sequence_order": 1
+    }
+]
+
+CRITICAL RULES:
+- Simple tasks (like "collect keys", "call mom", "buy milk") should have 1-2 units MAX
+- Only decompose if the task genuinely has multiple distinct phases
+- Don't break down obvious single actions into ridiculous micro-steps
+- Each unit should be a meaningful chunk of work (15+ minutes typically)
+- Don't include setup, travel, or trivial preparation steps
+- If it's a simple errand or call, keep it as ONE unit
+
+Examples:
+- "Collect keys from landlord" → 1 unit: "Collect keys from landlord"
+- "Call mom" → 1 unit: "Call mom"  
+- "Build user authentication system" → Multiple units for different components
+"""
+
+_SYS_PRIORITY = """
+Calculate a priority score (1-100) for this task based on:
+- Leverage: Impact on life/career/control (0-40 points)
+- Control: Can act independently without dependencies (0-30 points)  
+- Urgency: Deadline pressure or decay risk (0-30 points)
+
+Return only the integer score, no explanation.
+"""
+
+_SYS_SIMILAR = """
+Compare the new task against existing tasks and find similar ones that could be merged.
+
+Return a JSON object {"items": [...]} where the items array has this structure:
+[
+    {
+        "existing_task": "The similar existing task",
+        "similarity_score": 0.85,
+        "merge_suggestion": "How they could be combined"
+    }
+]
+
+Only return matches with similarity_score > 0.7
+"""
+
+_SYS_PROCESS = f"""
+You run three analyses on a single task in one pass. Return ONE JSON object with
+exactly these keys, each filled in by the matching section below:
+{{"micro_units": [...], "leverage": <0-40>, "control": <0-30>, "urgency": <0-30>, "similars": [...]}}
+
+## DECOMPOSE (put the items array in "micro_units")
+{_SYS_DECOMPOSE}
+## PRIORITY (instead of a bare score, fill "leverage", "control" and "urgency" with the three components)
+{_SYS_PRIORITY}
+## SIMILAR (put the items array in "similars"; use an empty array when no existing tasks are given)
+{_SYS_SIMILAR}"""
+
+_SYS_DECOMPOSE_BATCH = f"""{_SYS_DECOMPOSE}
+You will receive several tasks, each prefixed with its index like [0].
+Decompose every task independently and return a JSON object
+{{"results": [{{"task_index": 0, "units": [...]}}, ...]}} with exactly one entry per task,
+where "units" is that task's items array.
+"""
+
+_SYS_PRIORITY_BATCH = f"""{_SYS_PRIORITY}
+You will receive several tasks, each prefixed with its index like [0].
+Instead of a bare integer, score the three components of every task independently and return a JSON object
+{{"results": [{{"task_index": 0, "leverage": <0-40>, "control": <0-30>, "urgency": <0-30>}}, ...]}}
+with exactly one entry per task. The priority is their sum; do not add it up yourself.
+"""
+
+def _object_schema(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Strict object schema where every property is required"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False
+    }
+
+def _schema_format(name: str, properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a strict json_schema response_format for an object with these properties"""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "strict": True,
+            "schema": _object_schema(properties)
+        }
+    }
+
+def _items_format(name: str, properties: Dict[str, Any], key: str = "items") -> Dict[str, Any]:
+    """Build a strict json_schema response_format for {key: [{...}]}"""
+    return _schema_format(name, {
+        key: {"type": "array", "items": _object_schema(properties)}
+    })
+
+_FMT_PARSE = _items_format("tasks", {
+    "content": {"type": "string"},
+    "category": {"type": "string"},
+    "priority_hints": {"type": "string"},
+    "estimated_complexity": {"type": "string", "enum": ["low", "medium", "high"]}
+})
+_UNIT_PROPERTIES = {
+    "description": {"type": "string"},
+    "sequence_order": {"type": "integer"}
+}
+_FMT_DECOMPOSE_BATCH = _items_format("micro_units_batch", {
+    "task_index": {"type": "integer"},
+    "units": {"type": "array", "items": _object_schema(_UNIT_PROPERTIES)}
+}, key="results")
+_FMT_PRIORITY_BATCH = _items_format("priorities_batch", {
+    "task_index": {"type": "integer"},
+    "leverage": {"type": "integer"},
+    "control": {"type": "integer"},
+    "urgency": {"type": "integer"}
+}, key="results")
+_FMT_PROCESS = _schema_format("task_analysis", {
+    "micro_units": {"type": "array", "items": _object_schema(_UNIT_PROPERTIES)},
+    "leverage": {"type": "integer"},
+    "control": {"type": "integer"},
+    "urgency": {"type": "integer"},
+    "similars": {"type": "array", "items": _object_schema({
+        "existing_task": {"type": "string"},
+        "similarity_score": {"type": "number"},
+        "merge_suggestion": {"type": "string"}
+    })}
+})
+
+# Pre-built system messages, reused on every call so the prompt prefix stays
+# byte-identical and eligible for OpenAI's prompt cache
+_MSG_PARSE = {"role": "system", "content": _SYS_PARSE}
+_MSG_DECOMPOSE_BATCH = {"role": "system", "content": _SYS_DECOMPOSE_BATCH}
+_MSG_PRIORITY_BATCH = {"role": "system", "content": _SYS_PRIORITY_BATCH}
+_MSG_PROCESS = {"role": "system", "content": _SYS_PROCESS}
+
+@lru_cache(maxsize=1)
+def _get_client(api_key: str) -> OpenAI:
+    """Process-wide OpenAI client sharing one pooled HTTP/2 transport"""
+    http_client = httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        timeout=httpx.Timeout(60.0, connect=5.0)
+    )
+    return OpenAI(api_key=api_key, http_client=http_client)
+
 class AIEngine:
     def __init__(self):
-        api_key = OPENAI_API_KEY
+        api_key = settings.openai_api_key
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        self.client = OpenAI(api_key=api_key)
+        self.client = _get_client(api_key)
         self.model = "gpt-5-nano"  # Using your model
         
         # Pricing per 1M tokens
         self.pricing = {
             "input": 0.15,   # $0.15 per 1M input tokens
-            "output": 0.60   # $0.60 per 1M output tokens
+            "cached_input": 0.075,  # Prompt-cache hits are billed at half the input rate
+            "output": 0.60,  # $0.60 per 1M output tokens
+            "embedding": 0.02  # $0.02 per 1M embedding tokens
         }
+        
+        # Running OpenAI spend for this process
+        self.total_cost = 0.0
+        
+        # text -> L2-normalized embedding, oldest entries evicted first
+        self._emb_cache: Dict[str, np.ndarray] = {}
+        self._emb_lock = threading.Lock()
+        
+        # (method, sha256 of input) -> Future of the identical request already running
+        self._inflight: Dict[tuple[str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Parsed tasks and micro-units become the user's own tasks, so they are only
+        # reused for the exact same input; priority scores may come from a near-identical task
+        cache_path = settings.semantic_cache_path
+        self._parse_cache = ExactCache(cache_path, "parse")
+        self._decompose_cache = ExactCache(cache_path, "decompose")
+        self._priority_cache = SemanticCache(cache_path, "priority_components")
+    
+    def _create_completion(self, **kwargs):
+        """Streamed chat completion bounded by the shared request semaphore
+        
+        Tokens are read as they are generated, so the read timeout applies between
+        chunks instead of to the whole answer. The deltas are reassembled into an
+        object with the usual response.choices[0].message.content and response.usage.
+        """
+        parts = []
+        usage = None
+        with _OAI_SEM:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+            for event in stream:
+                if event.choices and event.choices[0].delta.content:
+                    parts.append(event.choices[0].delta.content)
+                if event.usage:
+                    usage = event.usage
+        
+        message = SimpleNamespace(content="".join(parts))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
     
     def calculate_cost(self, usage) -> float:
         """Calculate cost from OpenAI usage object"""
         if not usage:
             return 0.0
         
-        input_cost = (usage.prompt_tokens / 1_000_000) * self.pricing["input"]
+        cached_tokens = self._cached_tokens(usage)
+        input_cost = ((usage.prompt_tokens - cached_tokens) / 1_000_000) * self.pricing["input"]
+        input_cost += (cached_tokens / 1_000_000) * self.pricing["cached_input"]
         output_cost = (usage.completion_tokens / 1_000_000) * self.pricing["output"]
         
         return input_cost + output_cost
     
-    def parse_task_dump_with_cost(self, dump_text: str) -> tuple[List[Dict[str, Any]], float]:
-        """Parse raw task dump into structured tasks and return cost"""
-        system_prompt = """
-        You are a surgical task decomposition engine. Parse the user's brain dump into clean, actionable tasks.
-        
-        Extract distinct tasks and return them as JSON array with this structure:
-        [
-            {
-                "content": "Clear description of the task",
-                "category": "Work/Home/Health/Social/Finance/Learning/Misc",
-                "priority_hints": "Any urgency or importance clues",
-                "estimated_complexity": "low/medium/high"
-            }
-        ]
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """Prompt tokens served from OpenAI's prompt cache (usage object or Batch API dict)"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        if isinstance(details, dict):
+            return details.get("cached_tokens") or 0
+        return getattr(details, "cached_tokens", None) or 0
+    
+    def _track_cost(self, label: str, usage) -> float:
+        """Compute a call's cost, add it to the running total and log both"""
+        cost = self.calculate_cost(usage)
+        self.total_cost += cost
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                "%s cost: $%.4f ($%.4f total), %d/%d prompt tokens cached",
+                label, cost, self.total_cost,
+                self._cached_tokens(usage) if usage else 0,
+                usage.prompt_tokens if usage else 0
+            )
+        return cost
+    
+    def _singleflight(self, method: str, payload: bytes, call):
+        """Run call() once per identical in-flight (method, payload); duplicates share its result
         
-        Rules:
-        - Each task should be one clear objective
-        - Don't over-segment - keep related sub-tasks together
-        - Extract the essence, not the exact wording
-        - If something is vague, make it concrete
+        call returns (result, cost). Callers that joined an in-flight request get cost 0.0
+        since the first caller already paid for it.
         """
+        key = (method, hashlib.sha256(payload).hexdigest())
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        
+        if not leader:
+            logger.debug("Joining in-flight %s request", method)
+            result, _ = future.result()
+            return result, 0.0
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            outcome = call()
+            future.set_result(outcome)
+            return outcome
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+    
+    def parse_task_dump_with_cost(self, dump_text: str) -> tuple[List[Dict[str, Any]], float]:
+        """Parse raw task dump into structured tasks and return cost"""
+        return self._singleflight(
+            "parse", dump_text.encode("utf-8"),
+            lambda: self._parse_task_dump_with_cost(dump_text)
+        )
+    
+    def _parse_task_dump_with_cost(self, dump_text: str) -> tuple[List[Dict[str, Any]], float]:
+        hit = self._parse_cache.get(dump_text)
+        if hit is not None:
+            logger.debug("Exact cache hit (parse)")
+            return hit, 0.0
+        
+        try:
+            response = self._create_completion(
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    _MSG_PARSE,
                     {"role": "user", "content": f"Parse this task dump:\n\n{dump_text}"}
-                ]
+                ],
+                response_format=_FMT_PARSE,
+                prompt_cache_key="dexter_parse_v1"
             )
             
-            cost = self.calculate_cost(response.usage)
-            logger.info(f"Parse dump cost: ${cost:.4f}")
+            cost = self._track_cost("Parse dump", response.usage)
             
             content = response.choices[0].message.content
-            # Extract JSON from response
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            json_str = content[start_idx:end_idx]
-            
-            return json.loads(json_str), cost
+            tasks = orjson.loads(content)["items"]
+            if tasks:
+                self._parse_cache.put(dump_text, tasks)
+            return tasks, cost
         
         except Exception as e:
             logger.error(f"Failed to parse task dump: {e}")
             return [], 0.0
     
+    def _batch_lookup(self, cache: SemanticCache, queries: List[str]) -> tuple[List[Any], Optional[np.ndarray], List[int]]:
+        """Embed queries and return (cached responses or None, vectors, indices still to compute)"""
+        try:
+            vectors = self.embed(queries)
+        except Exception as e:
+            logger.warning(f"Semantic cache unavailable, calling model directly: {e}")
+            return [None] * len(queries), None, list(range(len(queries)))
+        
+        results = [cache.lookup(vector) for vector in vectors]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) < len(queries):
+            logger.debug("Semantic cache hits (%s): %d/%d", cache.namespace, len(queries) - len(pending), len(queries))
+        return results, vectors, pending
+    
+    @staticmethod
+    def _priority_context(task_content: str, task_metadata: Optional[Dict] = None) -> str:
+        """User message describing one task to the priority prompt"""
+        context = f"Task: {task_content}"
+        if task_metadata:
+            context += f"\nMetadata: {json.dumps(task_metadata, indent=2)}"
+        return context
+    
+    @staticmethod
+    def _decompose_batch_request(contents: List[str], indices: List[int]) -> Dict[str, Any]:
+        """Completion arguments decomposing contents[i] for every i in indices"""
+        listing = "\n\n".join(f"[{i}] {contents[i]}" for i in indices)
+        return {
+            "messages": [
+                _MSG_DECOMPOSE_BATCH,
+                {"role": "user", "content": f"Decompose these tasks:\n\n{listing}"}
+            ],
+            "response_format": _FMT_DECOMPOSE_BATCH,
+            "prompt_cache_key": "dexter_decompose_batch_v1"
+        }
+    
+    @staticmethod
+    def _priority_batch_request(contexts: List[str], indices: List[int]) -> Dict[str, Any]:
+        """Completion arguments scoring contexts[i] for every i in indices"""
+        listing = "\n\n".join(f"[{i}] {contexts[i]}" for i in indices)
+        return {
+            "messages": [
+                _MSG_PRIORITY_BATCH,
+                {"role": "user", "content": listing}
+            ],
+            "response_format": _FMT_PRIORITY_BATCH,
+            "prompt_cache_key": "dexter_priority_batch_v1"
+        }
+    
+    @staticmethod
+    def _results_by_index(content: Optional[str], key: Optional[str] = None) -> Dict[int, Any]:
+        """Map task_index -> result[key] (or the whole result) from a batched {"results": [...]} reply"""
+        if not content:
+            return {}
+        results = orjson.loads(content)["results"]
+        if key is None:
+            return {r["task_index"]: r for r in results}
+        return {r["task_index"]: r[key] for r in results}
+    
+    @staticmethod
+    def _priority_scores(record: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        """Clamp leverage/control/urgency to their ranges and add their sum as priority"""
+        if record is None:
+            scores = dict(DEFAULT_PRIORITY_COMPONENTS)
+        else:
+            scores = {
+                name: max(0, min(top, int(record.get(name, 0))))
+                for name, top in PRIORITY_COMPONENTS.items()
+            }
+        scores["priority"] = max(1, sum(scores.values()))
+        return scores
+    
+    def decompose_tasks_batch(self, contents: List[str]) -> tuple[List[List[Dict[str, Any]]], float]:
+        """Decompose several tasks in a single request and return per-task micro-units and cost"""
+        return self._singleflight(
+            "decompose", orjson.dumps(contents),
+            lambda: self._decompose_tasks_batch(contents)
+        )
+    
+    def _decompose_tasks_batch(self, contents: List[str]) -> tuple[List[List[Dict[str, Any]]], float]:
+        results = [self._decompose_cache.get(content) for content in contents]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if len(pending) < len(contents):
+            logger.debug("Exact cache hits (decompose): %d/%d", len(contents) - len(pending), len(contents))
+        if not pending:
+            return results, 0.0
+        
+        try:
+            response = self._create_completion(**self._decompose_batch_request(contents, pending))
+            
+            cost = self._track_cost(f"Decompose batch ({len(pending)} tasks)", response.usage)
+            
+            units_by_index = self._results_by_index(response.choices[0].message.content, "units")
+            for i in pending:
+                units = units_by_index.get(i)
+                if units is None:
+                    logger.warning(f"Decompose batch returned nothing for task {i}")
+                    results[i] = []
+                    continue
+                
+                results[i] = units
+                if units:
+                    self._decompose_cache.put(contents[i], units)
+            
+            return results, cost
+        
+        except Exception as e:
+            logger.error(f"Failed to decompose tasks: {e}")
+            return [result if result is not None else [] for result in results], 0.0
+    
     def decompose_task_with_cost(self, task_content: str) -> tuple[List[Dict[str, Any]], float]:
         """Decompose a task into atomic micro-units and return cost"""
-        system_prompt = """
-        You are a micro-unit decomposition specialist. Break down ONLY complex tasks that genuinely need multiple steps.
-
-        Return JSON array with this structure:
-        [
-            {
-                "description": "Specific, actionable micro-unit",
-                "sequence_order": 1
-            }
-        ]
+        units, cost = self.decompose_tasks_batch([task_content])
+        return units[0], cost
+    
+    def calculate_priorities_batch(self, items: List[tuple[str, Optional[Dict]]]) -> tuple[List[Dict[str, int]], float]:
+        """Score several (task_content, task_metadata) pairs in a single request
         
-        CRITICAL RULES:
-        - Simple tasks (like "collect keys", "call mom", "buy milk") should have 1-2 units MAX
-        - Only decompose if the task genuinely has multiple distinct phases
-        - Don't break down obvious single actions into ridiculous micro-steps
-        - Each unit should be a meaningful chunk of work (15+ minutes typically)
-        - Don't include setup, travel, or trivial preparation steps
-        - If it's a simple errand or call, keep it as ONE unit
-        
-        Examples:
-        - "Collect keys from landlord" → 1 unit: "Collect keys from landlord"
-        - "Call mom" → 1 unit: "Call mom"  
-        - "Build user authentication system" → Multiple units for different components
+        Returns per-task {"leverage", "control", "urgency", "priority"} scores and the cost.
         """
+        return self._singleflight(
+            "priority", orjson.dumps(items),
+            lambda: self._calculate_priorities_batch(items)
+        )
+    
+    def _calculate_priorities_batch(self, items: List[tuple[str, Optional[Dict]]]) -> tuple[List[Dict[str, int]], float]:
+        contexts = [self._priority_context(task_content, task_metadata) for task_content, task_metadata in items]
+        contents = [task_content for task_content, _ in items]
+        
+        # Keyed on the bare task text; the shared prompt wording would inflate similarity
+        results, vectors, pending = self._batch_lookup(self._priority_cache, contents)
+        if not pending:
+            return results, 0.0
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Decompose this task:\n\n{task_content}"}
-                ]
-            )
+            response = self._create_completion(**self._priority_batch_request(contexts, pending))
             
-            cost = self.calculate_cost(response.usage)
-            logger.info(f"Decompose task cost: ${cost:.4f}")
+            cost = self._track_cost(f"Priority batch ({len(pending)} tasks)", response.usage)
             
-            content = response.choices[0].message.content
-            start_idx = content.find('[')
-            end_idx = content.rfind(']') + 1
-            json_str = content[start_idx:end_idx]
+            records_by_index = self._results_by_index(response.choices[0].message.content)
+            for i in pending:
+                record = records_by_index.get(i)
+                if record is None:
+                    logger.warning(f"Priority batch returned nothing for task {i}")
+                    results[i] = self._priority_scores(None)  # Default priority
+                    continue
+                
+                results[i] = self._priority_scores(record)
+                if vectors is not None:
+                    self._priority_cache.put(contents[i], vectors[i], results[i])
             
-            return json.loads(json_str), cost
+            return results, cost
         
         except Exception as e:
-            logger.error(f"Failed to decompose task: {e}")
-            return [], 0.0
+            logger.error(f"Failed to calculate priorities: {e}")
+            return [result if result is not None else self._priority_scores(None) for result in results], 0.0
     
     def calculate_priority_with_cost(self, task_content: str, task_metadata: Dict = None) -> tuple[int, float]:
         """Calculate priority score based on leverage, control, urgency and return cost"""
-        system_prompt = """
-        Calculate a priority score (1-100) for this task based on:
-        - Leverage: Impact on life/career/control (0-40 points)
-        - Control: Can act independently without dependencies (0-30 points)  
-        - Urgency: Deadline pressure or decay risk (0-30 points)
+        scores, cost = self.calculate_priorities_batch([(task_content, task_metadata)])
+        return scores[0]["priority"], cost
+    
+    def process_task_with_cost(self, task_content: str, existing_tasks: List[str] = None,
+                               task_metadata: Dict = None) -> tuple[Dict[str, Any], float]:
+        """Decompose, prioritize and match one task in a single request and return cost
         
-        Return only the integer score, no explanation.
+        Returns {"micro_units", "scores", "similars"}; scores has the same shape as
+        calculate_priorities_batch's. Served from the caches when both the units
+        and the scores are already known.
         """
+        units = self._decompose_cache.get(task_content)
+        scores, vectors, pending = self._batch_lookup(self._priority_cache, [task_content])
+        if units is not None and not pending:
+            return {"micro_units": units, "scores": scores[0], "similars": []}, 0.0
         
         try:
-            context = f"Task: {task_content}"
-            if task_metadata:
-                context += f"\nMetadata: {json.dumps(task_metadata, indent=2)}"
+            context = self._priority_context(task_content, task_metadata)
+            if existing_tasks:
+                context += "\n\nExisting tasks:\n"
+                context += "\n".join(f"- {task}" for task in existing_tasks)
             
-            response = self.client.chat.completions.create(
-                model=self.model,
+            response = self._create_completion(
                 messages=[
-                    {"role": "system", "content": system_prompt},
+                    _MSG_PROCESS,
                     {"role": "user", "content": context}
-                ]
+                ],
+                response_format=_FMT_PROCESS,
+                prompt_cache_key="dexter_process_v1"
             )
             
-            cost = self.calculate_cost(response.usage)
-            logger.info(f"Priority calculation cost: ${cost:.4f}")
+            cost = self._track_cost("Process task", response.usage)
             
-            score = int(response.choices[0].message.content.strip())
-            return max(1, min(100, score)), cost  # Clamp between 1-100
+            data = orjson.loads(response.choices[0].message.content)
+            units = data["micro_units"]
+            scores = self._priority_scores(data)
+            
+            if units:
+                self._decompose_cache.put(task_content, units)
+            if vectors is not None:
+                self._priority_cache.put(task_content, vectors[0], scores)
+            
+            return {
+                "micro_units": units,
+                "scores": scores,
+                "similars": data["similars"] if existing_tasks else []
+            }, cost
         
         except Exception as e:
-            logger.error(f"Failed to calculate priority: {e}")
-            return 50, 0.0  # Default priority
+            logger.error(f"Failed to process task: {e}")
+            return {"micro_units": [], "scores": self._priority_scores(None), "similars": []}, 0.0
     
-    def find_similar_tasks(self, new_task: str, existing_tasks: List[str]) -> List[Dict[str, Any]]:
-        """Find similar existing tasks for potential merging"""
-        if not existing_tasks:
-            return []
+    def submit_batch(self, requests: Dict[str, Dict[str, Any]]) -> str:
+        """Upload {custom_id: completion arguments} as a Batch API job and return its id"""
+        lines = [
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": self.model, **body}
+            })
+            for custom_id, body in requests.items()
+        ]
+        
+        with _OAI_SEM:
+            batch_file = self.client.files.create(
+                file=("batch.jsonl", b"\n".join(lines)),
+                purpose="batch"
+            )
+            batch = self.client.batches.create(
+                input_file_id=batch_file.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h"
+            )
         
-        system_prompt = """
-        Compare the new task against existing tasks and find similar ones that could be merged.
+        logger.info(f"Submitted batch {batch.id} with {len(lines)} requests")
+        return batch.id
+    
+    def fetch_batch_results(self, batch_id: str) -> Optional[tuple[Dict[str, str], float]]:
+        """Return ({custom_id: reply content}, cost) once a batch is done, None while it runs"""
+        with _OAI_SEM:
+            batch = self.client.batches.retrieve(batch_id)
         
-        Return JSON array with this structure:
-        [
-            {
-                "existing_task": "The similar existing task",
-                "similarity_score": 0.85,
-                "merge_suggestion": "How they could be combined"
-            }
-        ]
+        if batch.status in BATCH_FAILED_STATUSES:
+            raise BatchFailedError(f"Batch {batch_id} ended with status '{batch.status}'")
+        if batch.status != "completed":
+            return None
+        if batch.output_file_id is None:
+            # Every request failed; the reasons are in the error file
+            raise BatchFailedError(f"Batch {batch_id} produced no output: {self._batch_error(batch.error_file_id)}")
         
-        Only return matches with similarity_score > 0.7
-        """
+        with _OAI_SEM:
+            output = self.client.files.content(batch.output_file_id).text
         
-        try:
-            context = f"New task: {new_task}\n\nExisting tasks:\n"
-            context += "\n".join([f"- {task}" for task in existing_tasks])
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": context}
-                ]
-            )
+        contents = {}
+        cost = 0.0
+        for line in output.splitlines():
+            if not line.strip():
+                continue
             
-            cost = self.calculate_cost(response.usage)
-            logger.info(f"Similar tasks search cost: ${cost:.4f}")
+            record = orjson.loads(line)
+            body = (record.get("response") or {}).get("body") or {}
+            if "choices" not in body:
+                logger.warning(f"Batch {batch_id} request '{record.get('custom_id')}' failed: {record.get('error')}")
+                continue
             
-            content = response.choices[0].message.content
-            if '[' in content and ']' in content:
-                start_idx = content.find('[')
-                end_idx = content.rfind(']') + 1
-                json_str = content[start_idx:end_idx]
-                return json.loads(json_str)
+            cost += self.calculate_cost(SimpleNamespace(**body["usage"])) * BATCH_DISCOUNT
+            contents[record["custom_id"]] = body["choices"][0]["message"]["content"]
+        
+        self.total_cost += cost
+        logger.info("Batch %s cost: $%.4f ($%.4f total)", batch_id, cost, self.total_cost)
+        return contents, cost
+    
+    def _batch_error(self, error_file_id: Optional[str]) -> str:
+        """First failure reason recorded in a batch's error file"""
+        if error_file_id is None:
+            return "no error file"
+        
+        with _OAI_SEM:
+            errors = self.client.files.content(error_file_id).text
+        
+        for line in errors.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            error = record.get("error") or ((record.get("response") or {}).get("body") or {}).get("error") or {}
+            return f"'{record.get('custom_id')}': {error.get('message', error)}"
+        return "empty error file"
+    
+    def submit_dump_batch(self, parsed_tasks: List[Dict[str, Any]]) -> str:
+        """Queue decompose + priority for a parsed dump on the Batch API and return the batch id"""
+        contents = [t["content"] for t in parsed_tasks]
+        contexts = [self._priority_context(t["content"], {"category": t.get("category")}) for t in parsed_tasks]
+        indices = list(range(len(parsed_tasks)))
+        
+        return self.submit_batch({
+            "decompose": self._decompose_batch_request(contents, indices),
+            "priority": self._priority_batch_request(contexts, indices)
+        })
+    
+    def collect_dump_batch(self, batch_id: str, task_count: int) -> Optional[tuple[List[List[Dict[str, Any]]], List[Dict[str, int]], float]]:
+        """Return (micro-units per task, priority scores, cost) for a finished dump batch, None while it runs"""
+        fetched = self.fetch_batch_results(batch_id)
+        if fetched is None:
+            return None
+        
+        contents, cost = fetched
+        if "decompose" not in contents:
+            # Storing the tasks without units would leave them undoable
+            raise BatchFailedError(f"Batch {batch_id} decompose request failed")
+        units_by_index = self._results_by_index(contents.get("decompose"), "units")
+        records_by_index = self._results_by_index(contents.get("priority"))
+        
+        micro_data_per_task = [units_by_index.get(i, []) for i in range(task_count)]
+        priorities = [self._priority_scores(records_by_index.get(i)) for i in range(task_count)]
+        return micro_data_per_task, priorities, cost
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return L2-normalized embeddings (one row per text), fetching only uncached texts"""
+        with self._emb_lock:
+            vectors = {t: self._emb_cache[t] for t in texts if t in self._emb_cache}
+        missing = [t for t in dict.fromkeys(texts) if t not in vectors]
+        
+        if missing:
+            with _OAI_SEM:
+                response = self.client.embeddings.create(model=EMBEDDING_MODEL, input=missing)
+            cost = (response.usage.prompt_tokens / 1_000_000) * self.pricing["embedding"]
+            self.total_cost += cost
+            logger.info("Embedding cost: $%.6f (%d texts)", cost, len(missing))
             
+            with self._emb_lock:
+                for text, item in zip(missing, response.data):
+                    vector = np.asarray(item.embedding, dtype=np.float32)
+                    vectors[text] = self._emb_cache[text] = vector / np.linalg.norm(vector)
+                
+                while len(self._emb_cache) > EMBEDDING_CACHE_SIZE:
+                    self._emb_cache.pop(next(iter(self._emb_cache)))
+        
+        return np.stack([vectors[t] for t in texts])
+    
+    def find_similar_tasks(self, new_task: str, existing_tasks: List[str],
+                           existing_vectors: Optional[np.ndarray] = None,
+                           new_vector: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Find similar existing tasks for potential merging by embedding cosine similarity
+        
+        existing_vectors, when given, holds the stored normalized embedding of each
+        existing task (one row per task); new_vector is new_task's own embedding if
+        already known. Anything not given is embedded here.
+        """
+        if not existing_tasks:
             return []
         
+        try:
+            if existing_vectors is None:
+                existing_vectors = self.embed(existing_tasks)
+            query = new_vector if new_vector is not None else self.embed([new_task])[0]
+            
+            scores = existing_vectors @ query
+            ranked = np.argsort(-scores)[:SIMILARITY_TOP_K]
+            return [
+                {"existing_task": existing_tasks[i], "similarity_score": float(scores[i])}
+                for i in ranked if scores[i] > SIMILARITY_THRESHOLD
+            ]
+        
         except Exception as e:
             logger.error(f"Failed to find similar tasks: {e}")
             return []
@@ -0,0 +1,48 @@
+import re
+
+# Kept free of bot, database and OpenAI imports so offline tools (prebuild_tts.py)
+# can use it without credentials
+
+class _SpeakableTable(dict):
+    """str.translate table keeping ASCII letters, digits, dots, commas and whitespace
+    
+    Each code point is decided on first sight and memoized, so the table stays as
+    small as the set of characters actually seen instead of covering all of Unicode.
+    """
+    def __missing__(self, codepoint: int):
+        char = chr(codepoint)
+        keep = (char.isascii() and (char.isalnum() or char in '.,')) or char.isspace()
+        self[codepoint] = codepoint if keep else None
+        return self[codepoint]
+
+# Built once for preprocess_text, which runs on every reply
+_SPEAKABLE = _SpeakableTable()
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Fixed replies; prebuild_tts.py synthesizes them ahead of time so they never hit Fish
+CANNED_REPLIES = (
+    "Send me your task dump",
+    "Processing tasks",
+    "No pending tasks",
+    "No tasks to complete",
+    "No more tasks",
+    "All tasks cleared",
+    "No tasks could be extracted from your input",
+    "Task manager ready. Use slash dump to add tasks, slash task for next task, slash done to complete",
+    "Unknown command",
+    "Use slash commands",
+    "Error getting task counts",
+    "Error getting next task",
+    "Error completing task",
+    "Error clearing tasks",
+    "Error processing tasks",
+    "Error processing queued tasks, please dump them again",
+)
+
+def preprocess_text(text: str) -> str:
+    """Clean text for TTS - keep only English letters, dots, and commas"""
+    # Keep only English letters (a-z, A-Z), dots, commas, and spaces
+    cleaned = text.translate(_SPEAKABLE)
+    # Clean up multiple spaces
+    cleaned = _WHITESPACE_RE.sub(' ', cleaned).strip()
+    return cleaned
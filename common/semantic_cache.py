@@ -0,0 +1,152 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Any, Optional
+
+import numpy as np
+import orjson
+
+logger = logging.getLogger()
+
+# Entries kept per namespace; the oldest are dropped first
+CACHE_MAX_ENTRIES = 5000
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS semantic_cache (
+            id INTEGER PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            query TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            response TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS exact_cache (
+            id INTEGER PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            response TEXT NOT NULL,
+            UNIQUE (namespace, key)
+        )
+    """)
+    conn.commit()
+    return conn
+
+class SemanticCache:
+    """Embedding-keyed response cache: near-identical queries reuse a stored answer.
+
+    Only suitable where a neighbour's answer is an acceptable answer (e.g. scores);
+    never for outputs that are stored as the user's own content.
+    Vectors must be L2-normalized so a dot product is the cosine similarity.
+    Entries live in memory as one matrix and are persisted to SQLite.
+    """
+
+    def __init__(self, path: str, namespace: str, threshold: float = 0.92,
+                 max_entries: int = CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+        self.conn = _connect(path)
+        rows = self.conn.execute(
+            "SELECT vector, response FROM semantic_cache WHERE namespace = ? ORDER BY id DESC LIMIT ?",
+            (namespace, max_entries)
+        ).fetchall()[::-1]
+
+        # Rows [0, size) of matrix are live; it grows by doubling, then wraps around
+        # at max_entries overwriting the oldest entry
+        self.responses = [orjson.loads(response) for _, response in rows]
+        self.matrix = (
+            np.stack([np.frombuffer(vector, dtype=np.float32) for vector, _ in rows])
+            if rows else None
+        )
+        self.size = len(rows)
+        self.next_slot = self.size % max_entries
+        logger.info(f"Semantic cache '{namespace}' loaded {len(rows)} entries")
+
+    def lookup(self, vector: np.ndarray) -> Optional[Any]:
+        """Return the stored response of the closest query above threshold"""
+        with self.lock:
+            if not self.size:
+                return None
+
+            sims = self.matrix[:self.size] @ vector
+            best = int(np.argmax(sims))
+            if sims[best] >= self.threshold:
+                return self.responses[best]
+
+        return None
+
+    def put(self, query: str, vector: np.ndarray, response: Any):
+        """Store a response for a query embedding"""
+        vector = np.asarray(vector, dtype=np.float32)
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO semantic_cache (namespace, query, vector, response) VALUES (?, ?, ?, ?)",
+                (self.namespace, query, vector.tobytes(), orjson.dumps(response).decode())
+            )
+            self.conn.execute(
+                """DELETE FROM semantic_cache WHERE namespace = ? AND id NOT IN (
+                       SELECT id FROM semantic_cache WHERE namespace = ? ORDER BY id DESC LIMIT ?
+                   )""",
+                (self.namespace, self.namespace, self.max_entries)
+            )
+            self.conn.commit()
+
+            if self.matrix is None:
+                self.matrix = np.empty((min(64, self.max_entries), vector.shape[0]), dtype=np.float32)
+            elif self.size == len(self.matrix) < self.max_entries:
+                grown = np.empty((min(2 * self.size, self.max_entries), self.matrix.shape[1]), dtype=np.float32)
+                grown[:self.size] = self.matrix
+                self.matrix = grown
+
+            slot = self.next_slot
+            self.matrix[slot] = vector
+            if slot < len(self.responses):
+                self.responses[slot] = response
+            else:
+                self.responses.append(response)
+            self.size = max(self.size, slot + 1)
+            self.next_slot = (slot + 1) % self.max_entries
+
+class ExactCache:
+    """Response cache keyed by a hash of the exact input, persisted to SQLite"""
+
+    def __init__(self, path: str, namespace: str, max_entries: int = CACHE_MAX_ENTRIES):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = _connect(path)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, text: str) -> Optional[Any]:
+        """Return the response stored for exactly this text"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM exact_cache WHERE namespace = ? AND key = ?",
+                (self.namespace, self._key(text))
+            ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def put(self, text: str, response: Any):
+        """Store the response for text"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO exact_cache (namespace, key, response) VALUES (?, ?, ?)",
+                (self.namespace, self._key(text), orjson.dumps(response).decode())
+            )
+            self.conn.execute(
+                """DELETE FROM exact_cache WHERE namespace = ? AND id NOT IN (
+                       SELECT id FROM exact_cache WHERE namespace = ? ORDER BY id DESC LIMIT ?
+                   )""",
+                (self.namespace, self.namespace, self.max_entries)
+            )
+            self.conn.commit()
@@ -1,18 +1,38 @@
 from typing import List, Optional, Dict, Any
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import logging
 
+import numpy as np
+
 from database.database import db
-from database.models import Task, MicroUnit, Execution
-from common.openai import ai
+from database.models import Task, MicroUnit, Execution, PendingBatch, TaskEmbedding
+from common.openai import ai, BatchFailedError
+from common.config import OPENAI_BATCH_MIN_TASKS
 
-from sqlalchemy import text
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.exc import DBAPIError
 
 logger = logging.getLogger()
 
+# Parallel OpenAI calls (AIEngine also caps requests process-wide)
+MAX_CONCURRENT_AI_CALLS = 10
+
+OPEN_STATUSES = ('pending', 'active')
+
+def content_hash(text: str) -> str:
+    """md5 hex digest, matching Postgres md5() so migrations can backfill it"""
+    return hashlib.md5(text.encode()).hexdigest()
+
 class TaskManager:
     def __init__(self):
-        self.session = db.get_session()
+        # Proxy to the calling thread's session; callers scope it with db.session_scope()
+        self.session = db.Session
+        self.executor = ThreadPoolExecutor(
+            max_workers=MAX_CONCURRENT_AI_CALLS,
+            thread_name_prefix="ai"
+        )
     
     def process_dump(self, dump_text: str) -> Dict[str, Any]:
         """Main entry point: process raw task dump"""
@@ -54,8 +74,22 @@ class TaskManager:
         self.session.commit()
         return results
     
-    def process_dump_with_cost(self, dump_text: str) -> tuple[Dict[str, Any], float]:
-        """Main entry point: process raw task dump and return total OpenAI cost"""
+    def process_dump_with_cost(self, dump_text: str, notify_chat_id: Optional[int] = None) -> tuple[Dict[str, Any], float]:
+        """Main entry point: process raw task dump and return total OpenAI cost
+        
+        Large dumps from a chat (notify_chat_id set) go to the Batch API at half
+        price; results["batched_tasks"] is then non-zero and the tasks are stored
+        later by collect_finished_batches.
+        
+        A dump whose tasks are still open (or still batched) is answered from the
+        database without calling OpenAI.
+        """
+        dump_hash = content_hash(dump_text)
+        stored = self._stored_dump_results(dump_hash)
+        if stored is not None:
+            logger.debug("Using stored dump result for: %.50s...", dump_text)
+            return stored, 0.0
+        
         logger.info("Processing task dump...")
         
         total_openai_cost = 0.0
@@ -64,49 +98,289 @@ class TaskManager:
         parsed_tasks, parse_cost = ai.parse_task_dump_with_cost(dump_text)
         total_openai_cost += parse_cost
         
-        results = {
+        results = self._empty_results()
+        
+        if notify_chat_id is not None and 0 < OPENAI_BATCH_MIN_TASKS < len(parsed_tasks):
+            try:
+                batch_id = ai.submit_dump_batch(parsed_tasks)
+            except Exception as e:
+                logger.error(f"Batch submission failed, processing synchronously: {e}")
+            else:
+                self.session.add(PendingBatch(
+                    batch_id=batch_id,
+                    chat_id=notify_chat_id,
+                    parsed_tasks=parsed_tasks,
+                    dump_hash=dump_hash
+                ))
+                self.session.commit()
+                results["batched_tasks"] = len(parsed_tasks)
+                return results, total_openai_cost
+        
+        if len(parsed_tasks) == 1:
+            # A lone task is decomposed, scored and matched against its similar
+            # tasks in one combined request
+            task_data = parsed_tasks[0]
+            vectors = self._embed_tasks(parsed_tasks)
+            similar = self._check_similar(parsed_tasks, vectors)
+            
+            processed, process_cost = ai.process_task_with_cost(
+                task_data["content"], similar[0], {"category": task_data.get("category")}
+            )
+            total_openai_cost += process_cost
+            for match in processed["similars"]:
+                logger.info("Merge suggestion for '%.50s': %s",
+                            task_data["content"], match.get("merge_suggestion"))
+            
+            self._store_tasks(parsed_tasks, [processed["scores"]], [processed["micro_units"]],
+                              results, vectors, dump_hash)
+            
+            self.session.commit()
+            return results, total_openai_cost
+        
+        # Steps 3-4 each cover the whole dump in one batched request; run the two
+        # concurrently. DB work stays on this thread since the session isn't thread-safe
+        priority_future = self.executor.submit(
+            ai.calculate_priorities_batch,
+            [(t["content"], {"category": t.get("category")}) for t in parsed_tasks]
+        )
+        decompose_future = self.executor.submit(
+            ai.decompose_tasks_batch,
+            [t["content"] for t in parsed_tasks]
+        )
+        embed_future = self.executor.submit(self._embed_tasks, parsed_tasks)
+        
+        # Step 2 only needs the embeddings, so it overlaps with the slower model calls above
+        vectors = embed_future.result()
+        self._check_similar(parsed_tasks, vectors)
+        
+        priorities, priority_cost = priority_future.result()
+        micro_data_per_task, decompose_cost = decompose_future.result()
+        total_openai_cost += priority_cost + decompose_cost
+        
+        self._store_tasks(parsed_tasks, priorities, micro_data_per_task, results,
+                          vectors, dump_hash)
+        
+        self.session.commit()
+        return results, total_openai_cost
+    
+    def collect_finished_batches(self) -> List[tuple[int, Optional[Dict[str, Any]], float]]:
+        """Store tasks from completed dump batches
+        
+        Returns (chat_id, results, cost) per finished batch; results is None if the batch failed.
+        """
+        finished = []
+        
+        for pending in self.session.query(PendingBatch).order_by(PendingBatch.id).all():
+            try:
+                collected = ai.collect_dump_batch(pending.batch_id, len(pending.parsed_tasks))
+            except BatchFailedError as e:
+                logger.error(str(e))
+                self.session.delete(pending)
+                self.session.commit()
+                finished.append((pending.chat_id, None, 0.0))
+                continue
+            except Exception as e:
+                logger.warning(f"Could not check batch {pending.batch_id}, will retry: {e}")
+                continue
+            
+            if collected is None:
+                continue  # Still running
+            
+            micro_data_per_task, priorities, cost = collected
+            results = self._empty_results()
+            vectors = self._embed_tasks(pending.parsed_tasks)
+            self._check_similar(pending.parsed_tasks, vectors)
+            self._store_tasks(pending.parsed_tasks, priorities, micro_data_per_task, results,
+                              vectors, pending.dump_hash)
+            
+            self.session.delete(pending)
+            self.session.commit()
+            finished.append((pending.chat_id, results, cost))
+        
+        return finished
+    
+    @staticmethod
+    def _empty_results() -> Dict[str, Any]:
+        return {
             "new_tasks": 0,
             "merged_tasks": 0,
             "total_micro_units": 0,
+            "batched_tasks": 0,
             "tasks_created": []
         }
-        
-        for task_data in parsed_tasks:
-            # Step 2: Check for similar existing tasks
-            similar_tasks = self._find_similar_existing_tasks(task_data["content"])
-            
-            if similar_tasks:
-                logger.info(f"Found similar tasks, considering merge...")
-                # For now, create anyway - later we can implement smart merging
-            
-            # Step 3: Create task (includes priority calculation cost)
-            task, priority_cost = self._create_task_with_cost(task_data)
-            total_openai_cost += priority_cost
-            
-            # Step 4: Decompose into micro-units
-            micro_units, decompose_cost = self._decompose_task_with_cost(task)
-            total_openai_cost += decompose_cost
-            
+    
+    def _stored_dump_results(self, dump_hash: str) -> Optional[Dict[str, Any]]:
+        """Results of an earlier run of the same dump, or None if it must be processed"""
+        results = self._empty_results()
+        
+        batched = self.session.execute(
+            select(PendingBatch.parsed_tasks).where(PendingBatch.dump_hash == dump_hash).limit(1)
+        ).scalar()
+        if batched is not None:
+            results["batched_tasks"] = len(batched)
+            return results
+        
+        rows = self.session.execute(
+            select(Task.id, Task.content, Task.priority, func.count(MicroUnit.id))
+            .outerjoin(MicroUnit)
+            .where(Task.dump_hash == dump_hash, Task.status.in_(OPEN_STATUSES))
+            .group_by(Task.id)
+            .order_by(Task.id)
+        ).all()
+        if not rows:
+            return None
+        
+        for task_id, content, priority, unit_count in rows:
             results["new_tasks"] += 1
-            results["total_micro_units"] += len(micro_units)
+            results["total_micro_units"] += unit_count
             results["tasks_created"].append({
-                "task_id": task.id,
-                "content": task.content[:50] + "...",
-                "micro_units": len(micro_units),
-                "priority": task.priority
+                "task_id": task_id,
+                "content": content[:50] + "...",
+                "micro_units": unit_count,
+                "priority": priority
             })
+        return results
+    
+    @staticmethod
+    def _embed_tasks(parsed_tasks: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Embed parsed task contents for similarity search; None if embedding fails"""
+        if not parsed_tasks:
+            return None
+        try:
+            return ai.embed([t["content"] for t in parsed_tasks])
+        except Exception as e:
+            logger.error(f"Failed to embed tasks: {e}")
+            return None
+    
+    def _check_similar(self, parsed_tasks: List[Dict[str, Any]], vectors: Optional[np.ndarray]) -> List[List[str]]:
+        """Step 2: Check for similar existing tasks
+        
+        Uses the nearest stored embeddings, or full-text search when the dump
+        couldn't be embedded. Returns the similar open task contents per parsed task.
+        """
+        if vectors is not None:
+            contents, matrix = self._open_task_vectors()
+            similar = [
+                [match["existing_task"] for match in ai.find_similar_tasks(task_data["content"], contents, matrix, vector)]
+                if matrix is not None else []
+                for task_data, vector in zip(parsed_tasks, vectors)
+            ]
+        else:
+            similar = [
+                [task.content for task in self._find_similar_existing_tasks(task_data["content"])]
+                for task_data in parsed_tasks
+            ]
+        
+        for task_data, matches in zip(parsed_tasks, similar):
+            if matches:
+                logger.info("Found %d similar tasks for '%.50s', considering merge...",
+                            len(matches), task_data["content"])
+                # For now, create anyway - later we can implement smart merging
+        return similar
+    
+    def _store_tasks(self, parsed_tasks: List[Dict[str, Any]], priorities: List[Dict[str, int]],
+                     micro_data_per_task: List[List[Dict[str, Any]]], results: Dict[str, Any],
+                     vectors: Optional[np.ndarray] = None, dump_hash: Optional[str] = None):
+        """Create tasks with their micro-units and tally them into results (no commit)
+        
+        Tasks, micro-units and embeddings each go in as one multi-row INSERT.
+        Tasks identical to an open task are skipped and counted as merged.
+        
+        Hashes mark a task (and its dump) as done with, so a task whose decompose
+        failed gets neither; resending the dump then retries it instead of
+        replaying the empty result.
+        """
+        if any(not micro_data for micro_data in micro_data_per_task):
+            dump_hash = None
+        
+        hashes = [content_hash(t["content"]) for t in parsed_tasks]
+        taken = set(self.session.execute(
+            select(Task.content_hash)
+            .where(Task.content_hash.in_(hashes), Task.status.in_(OPEN_STATUSES))
+        ).scalars())
+        
+        keep = []
+        for i, h in enumerate(hashes):
+            if h in taken:
+                results["merged_tasks"] += 1
+            else:
+                taken.add(h)
+                keep.append(i)
+        
+        if len(keep) < len(parsed_tasks):
+            parsed_tasks = [parsed_tasks[i] for i in keep]
+            priorities = [priorities[i] for i in keep]
+            micro_data_per_task = [micro_data_per_task[i] for i in keep]
+            hashes = [hashes[i] for i in keep]
+            if vectors is not None:
+                vectors = vectors[keep]
+        
+        if not parsed_tasks:
+            return
         
-        self.session.commit()
-        return results, total_openai_cost
+        # Step 3: Create tasks with their calculated priorities
+        task_ids = self.session.execute(
+            insert(Task).returning(Task.id, sort_by_parameter_order=True),
+            [
+                {
+                    "content": task_data["content"],
+                    "priority": scores["priority"],
+                    "leverage": scores["leverage"],
+                    "control": scores["control"],
+                    "urgency": scores["urgency"],
+                    "pending_units": len(micro_data),
+                    "dump_hash": dump_hash,
+                    "content_hash": task_hash if micro_data else None,
+                    "task_metadata": {
+                        "category": task_data.get("category"),
+                        "estimated_complexity": task_data.get("estimated_complexity"),
+                        "priority_hints": task_data.get("priority_hints")
+                    }
+                }
+                for task_data, scores, micro_data, task_hash
+                in zip(parsed_tasks, priorities, micro_data_per_task, hashes)
+            ]
+        ).scalars().all()
+        
+        # Step 4: Attach micro-units
+        unit_rows = [
+            {
+                "task_id": task_id,
+                "description": unit_data["description"],
+                "sequence_order": unit_data.get("sequence_order", i + 1),
+                "unit_metadata": {}
+            }
+            for task_id, micro_data in zip(task_ids, micro_data_per_task)
+            for i, unit_data in enumerate(micro_data)
+        ]
+        if unit_rows:
+            self.session.execute(insert(MicroUnit), unit_rows)
+        
+        if vectors is not None:
+            self.session.execute(
+                insert(TaskEmbedding),
+                [{"task_id": task_id, "vector": vector.tobytes()} for task_id, vector in zip(task_ids, vectors)]
+            )
+        
+        for task_id, task_data, scores, micro_data in zip(task_ids, parsed_tasks, priorities, micro_data_per_task):
+            results["new_tasks"] += 1
+            results["total_micro_units"] += len(micro_data)
+            results["tasks_created"].append({
+                "task_id": task_id,
+                "content": task_data["content"][:50] + "...",
+                "micro_units": len(micro_data),
+                "priority": scores["priority"]
+            })
     
     def get_next_action(self) -> Optional[MicroUnit]:
         """Binary decision: Get next micro-unit to execute (READ-ONLY)"""
-        # Get highest priority pending micro-unit WITHOUT changing status
+        # Get highest priority pending micro-unit WITHOUT changing status; the partial
+        # indexes on open tasks and pending units serve this ordering
         next_unit = (
             self.session.query(MicroUnit)
             .join(Task)
             .filter(MicroUnit.status == 'pending')
-            .filter(Task.status.in_(['pending', 'active']))
+            .filter(Task.status.in_(OPEN_STATUSES))
             .order_by(Task.priority.desc(), MicroUnit.sequence_order.asc())
             .first()
         )
@@ -140,39 +414,80 @@ class TaskManager:
     
     def complete_micro_unit(self, micro_unit_id: int, success: bool = True, 
                           actual_minutes: int = None, notes: str = None):
-        """Mark micro-unit as complete and log execution"""
-        micro_unit = self.session.get(MicroUnit, micro_unit_id)
+        """Mark micro-unit as complete and log execution
+        
+        The unit update, the execution log and the task's pending_units decrement
+        run as a single statement. Only a pending or active unit can complete, so
+        a repeated call neither logs twice nor decrements twice.
+        """
+        now = datetime.now()
+        row = self.session.execute(
+            text("""
+                WITH done AS (
+                    UPDATE micro_units
+                    SET status = 'complete',
+                        completed_at = :now,
+                        actual_minutes = COALESCE(:actual_minutes, actual_minutes)
+                    WHERE id = :unit_id
+                    AND status IN ('pending', 'active')
+                    RETURNING id, task_id, description
+                ),
+                logged AS (
+                    INSERT INTO executions (micro_unit_id, started_at, completed_at, success, notes)
+                    SELECT id, :now, :now, :success, :notes FROM done
+                ),
+                counted AS (
+                    UPDATE tasks
+                    SET pending_units = GREATEST(pending_units - 1, 0),
+                        status = CASE WHEN pending_units <= 1 THEN 'complete' ELSE status END,
+                        updated_at = :now
+                    FROM done
+                    WHERE tasks.id = done.task_id
+                    RETURNING tasks.content, tasks.status
+                )
+                SELECT done.description,
+                       (SELECT content FROM counted WHERE status = 'complete') AS finished_task
+                FROM done
+            """),
+            {
+                "unit_id": micro_unit_id,
+                "now": now,
+                "actual_minutes": actual_minutes or None,
+                "success": success,
+                "notes": notes
+            }
+        ).first()
         
-        if not micro_unit:
-            logger.warning(f"Micro-unit {micro_unit_id} not found")
+        if not row:
+            self.session.rollback()
+            logger.warning(f"Micro-unit {micro_unit_id} not found or already complete")
             return
         
-        # Mark complete
-        micro_unit.mark_complete(actual_minutes)
-        
-        # Log execution
-        execution = Execution(
-            micro_unit_id=micro_unit_id,
-            completed_at=datetime.now(),
-            success=success,
-            notes=notes
-        )
-        self.session.add(execution)
+        self.session.commit()
         
-        # Check if task is complete
-        remaining_units = (
-            self.session.query(MicroUnit)
-            .filter(MicroUnit.task_id == micro_unit.task_id)
-            .filter(MicroUnit.status == 'pending')
-            .count()
-        )
+        if row.finished_task is not None:
+            logger.info(f"Task complete: {row.finished_task[:50]}...")
+        logger.info(f"Micro-unit completed: {row.description[:50]}...")
+    
+    def clear_all(self):
+        """Delete every task together with its micro-units, executions and embeddings
         
-        if remaining_units == 0:
-            micro_unit.task.status = 'complete'
-            logger.info(f"Task complete: {micro_unit.task.content[:50]}...")
+        Dumps still queued on the Batch API are dropped too, so they never reappear.
+        """
+        try:
+            with self.session.begin_nested():
+                self.session.execute(text(
+                    "TRUNCATE tasks, micro_units, executions, task_embeddings, pending_batches RESTART IDENTITY"
+                ))
+        except DBAPIError as e:
+            # TRUNCATE needs its own privilege; foreign keys cascade a plain DELETE too
+            logger.warning(f"TRUNCATE failed, deleting instead: {e}")
+            self.session.execute(text("DELETE FROM tasks"))
+            self.session.execute(text("DELETE FROM pending_batches"))
         
         self.session.commit()
-        logger.info(f"Micro-unit completed: {micro_unit.description[:50]}...")
+        self.session.expunge_all()
+        logger.info("All tasks cleared")
     
     def get_status_summary(self) -> Dict[str, Any]:
         """Get current status summary"""
@@ -205,25 +520,48 @@ class TaskManager:
         
         return summary
     
+    def find_similar_tasks(self, task_content: str) -> List[Dict[str, Any]]:
+        """Find open tasks close to task_content using their stored embeddings"""
+        contents, matrix = self._open_task_vectors()
+        if matrix is None:
+            return []
+        return ai.find_similar_tasks(task_content, contents, matrix)
+    
+    def _open_task_vectors(self) -> tuple[List[str], Optional[np.ndarray]]:
+        """Contents of open tasks with their stored embeddings stacked one row per task"""
+        rows = (
+            self.session.query(Task.content, TaskEmbedding.vector)
+            .join(TaskEmbedding, TaskEmbedding.task_id == Task.id)
+            .filter(Task.status.in_(OPEN_STATUSES))
+            .all()
+        )
+        if not rows:
+            return [], None
+        
+        contents = [content for content, _ in rows]
+        return contents, np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+    
     def _find_similar_existing_tasks(self, task_content: str) -> List[Task]:
         """Find similar existing tasks using full-text search"""
         try:
-            # Use PostgreSQL full-text search
+            # Use PostgreSQL full-text search; search_vector is GIN-indexed (tasks_search_idx)
             query = text("""
-                SELECT id, content, ts_rank(search_vector, plainto_tsquery(:query)) as rank
-                FROM tasks 
-                WHERE search_vector @@ plainto_tsquery(:query)
+                SELECT tasks.*
+                FROM tasks, plainto_tsquery(:query) AS q
+                WHERE search_vector @@ q
                 AND status IN ('pending', 'active')
-                ORDER BY rank DESC
+                AND ts_rank(search_vector, q) > 0.1
+                ORDER BY ts_rank(search_vector, q) DESC
                 LIMIT 5
             """)
             
-            results = self.session.execute(query, {"query": task_content}).fetchall()
-            
-            if results:
-                # Get Task objects
-                task_ids = [r[0] for r in results if r[2] > 0.1]  # rank threshold
-                return self.session.query(Task).filter(Task.id.in_(task_ids)).all()
+            # A savepoint keeps a failed search (e.g. no search_vector yet) from
+            # aborting the surrounding transaction
+            with self.session.begin_nested():
+                return self.session.scalars(
+                    select(Task).from_statement(query),
+                    {"query": task_content}
+                ).all()
             
         except Exception as e:
             logger.warning(f"Full-text search failed, using fallback: {e}")
@@ -239,6 +577,7 @@ class TaskManager:
         
         task = Task(
             content=task_data["content"],
+            content_hash=content_hash(task_data["content"]),
             priority=priority,
             metadata={
                 "category": task_data.get("category"),
@@ -251,27 +590,6 @@ class TaskManager:
         self.session.flush()  # Get the ID
         return task
     
-    def _create_task_with_cost(self, task_data: Dict[str, Any]) -> tuple[Task, float]:
-        """Create a new task from parsed data and return OpenAI cost"""
-        priority, cost = ai.calculate_priority_with_cost(
-            task_data["content"], 
-            {"category": task_data.get("category")}
-        )
-        
-        task = Task(
-            content=task_data["content"],
-            priority=priority,
-            metadata={
-                "category": task_data.get("category"),
-                "estimated_complexity": task_data.get("estimated_complexity"),
-                "priority_hints": task_data.get("priority_hints")
-            }
-        )
-        
-        self.session.add(task)
-        self.session.flush()  # Get the ID
-        return task, cost
-    
     def _decompose_task(self, task: Task) -> List[MicroUnit]:
         """Decompose task into micro-units"""
         micro_data = ai.decompose_task(task.content)
@@ -293,26 +611,10 @@ class TaskManager:
         
         return micro_units
     
-    def _decompose_task_with_cost(self, task: Task) -> tuple[List[MicroUnit], float]:
-        """Decompose task into micro-units and return OpenAI cost"""
-        micro_data, cost = ai.decompose_task_with_cost(task.content)
-        micro_units = []
-        
-        for i, unit_data in enumerate(micro_data):
-            micro_unit = MicroUnit(
-                task_id=task.id,
-                description=unit_data["description"],
-                sequence_order=unit_data.get("sequence_order", i + 1),
-                metadata={}
-            )
-            micro_units.append(micro_unit)
-            self.session.add(micro_unit)
-        
-        return micro_units, cost
-    
     def close(self):
-        """Close database session"""
-        self.session.close()
+        """Close database session and stop AI workers"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.remove()
 
 # Usage helper
 def create_task_manager():
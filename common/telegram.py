@@ -1,52 +1,176 @@
 import requests
-import json
+from requests.adapters import HTTPAdapter
+import orjson
 import logging
-import re
-import hashlib
 import os
+import random
 from typing import Dict, Any, Optional, List
 import time
-from threading import Thread
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, Future
 
-from common.config import TELEGRAM_BOT_TOKEN, ADMIN_USER_ID
+from cachetools import TTLCache
+from requests_toolbelt import MultipartEncoder
+
+from common.config import TELEGRAM_BOT_TOKEN, ADMIN_USER_ID, TELEGRAM_OFFSET_PATH
 from common.task_manager import create_task_manager
+from database.database import db
 from common.fish import FishClient
+from common import replies, tts_cache
 
 logger = logging.getLogger()
 
+# How often the polling loop asks OpenAI about queued dump batches
+BATCH_CHECK_INTERVAL = 30  # seconds
+
+# Conversation states expire if the user never sends the follow-up message
+USER_STATE_MAX = 10_000
+USER_STATE_TTL = 600  # seconds
+
+# getUpdates long-polls on the server; the client gives up a little later
+POLL_TIMEOUT = 30  # seconds
+POLL_CLIENT_TIMEOUT = POLL_TIMEOUT + 5
+# Connection pool sized for the poller plus the reply workers
+HTTP_POOL_SIZE = 8
+
+# Small clips (canned replies) are kept in memory; larger ones stream from disk
+VOICE_BYTES_CACHE_MAX = 64
+VOICE_BYTES_CACHE_TTL = 3600  # seconds
+VOICE_BYTES_LIMIT = 256 * 1024
+
+# Polling retries back off exponentially (with jitter) up to this cap
+BACKOFF_INITIAL = 1.0  # seconds
+BACKOFF_MAX = 60.0
+
+# Only message updates are handled; Telegram expects this as a JSON-encoded array
+_ALLOWED_UPDATES = orjson.dumps(["message"]).decode()
+_REMOVE_KEYBOARD = orjson.dumps({"remove_keyboard": True}).decode()
+
+# Updates are handled on a worker pool so getUpdates keeps polling during slow dumps
+UPDATE_WORKERS = 8
+# Voice replies run on their own pools so handlers don't wait on them
+REPLY_WORKERS = 4  # uploads, in order per chat
+TTS_WORKERS = 4  # Fish synthesis, in parallel
+
 class TelegramBot:
     def __init__(self):
         self.token = TELEGRAM_BOT_TOKEN
         if not self.token:
             raise ValueError("TELEGRAM_BOT_TOKEN not found in config")
         
+        # ADMIN_USER_ID may list several comma-separated ids; parsed once, not per message
+        self._admin_ids = frozenset(int(x) for x in (ADMIN_USER_ID or "").split(",") if x.strip())
+        if not self._admin_ids:
+            raise ValueError("ADMIN_USER_ID not found in config")
+        
         self.base_url = f"https://api.telegram.org/bot{self.token}"
-        self.offset = 0
+        # One keep-alive connection pool for polling and uploads instead of a TLS handshake per call
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE))
+        self.offset = self.load_offset()
         self.running = False
+        self.next_batch_check = 0.0
         self.task_manager = create_task_manager()
         self.fish = FishClient()
         
-        # User states for conversation flow
-        self.user_states = {}  # user_id -> current_state
+        # User states for conversation flow; TTLCache isn't thread-safe, so go through state_lock
+        self.user_states = TTLCache(maxsize=USER_STATE_MAX, ttl=USER_STATE_TTL)  # user_id -> current_state
+        self.state_lock = Lock()
         
-        # Caching
-        self.tts_cache = {}    # text_hash -> file_path
-        self.dump_cache = {}   # dump_hash -> results
+        # Caching (TTS clips are cached on disk by common.tts_cache, dumps by hash in the database)
+        self.voice_bytes = TTLCache(maxsize=VOICE_BYTES_CACHE_MAX, ttl=VOICE_BYTES_CACHE_TTL)  # mp3_path -> bytes
+        self.voice_bytes_lock = Lock()  # Shared by the reply workers
         
-        # Ensure media directory exists
-        os.makedirs('media', exist_ok=True)
+        # Worker pools for updates and voice replies. Each key (user, a user's dumps,
+        # chat, or batch checks) runs its jobs in order while different keys run in
+        # parallel. Update jobs each get their own short-lived DB session
+        self.executor = ThreadPoolExecutor(max_workers=UPDATE_WORKERS, thread_name_prefix="tg")
+        self.reply_executor = ThreadPoolExecutor(max_workers=REPLY_WORKERS, thread_name_prefix="tg-reply")
+        self.tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+        self.dispatch_lock = Lock()
+        self.dispatch_tails = {}  # key -> last future chained for it
+        self.batch_check: Optional[Future] = None  # Only touched by the polling thread
     
-    def preprocess_text(self, text: str) -> str:
-        """Clean text for TTS - keep only English letters, dots, and commas"""
-        # Keep only English letters (a-z, A-Z), dots, commas, and spaces
-        cleaned = re.sub(r'[^a-zA-Z0-9.,\s]', '', text)
-        # Clean up multiple spaces
-        cleaned = re.sub(r'\s+', ' ', cleaned).strip()
-        return cleaned
+    def dispatch(self, key: Any, fn, *args) -> Future:
+        """Run fn(*args) on the worker pool after everything dispatched earlier for key"""
+        return self._chain(self.executor, ("update", key), self._in_session, fn, *args)
+    
+    def queue_voice_message(self, chat_id: int, text: str, openai_cost: float = 0.0) -> Future:
+        """Send a voice reply in the background, keeping replies to one chat in order
+        
+        Synthesis starts right away on the TTS pool; only the uploads are chained, so
+        a burst of replies synthesizes in parallel while earlier clips upload.
+        """
+        clean_text = self.preprocess_text(text)
+        if not clean_text:
+            skipped = Future()
+            skipped.set_result(False)
+            return skipped
+        
+        synth = self.tts_executor.submit(self.fish.text_to_mp3_with_cost, clean_text)
+        return self.queue_reply(chat_id, self._send_synthesized, chat_id, synth, openai_cost)
+    
+    def queue_voice_clips(self, chat_id: int, texts: List[str], openai_cost: float = 0.0) -> Future:
+        """Send several texts as one voice reply built from their individually cached clips
+        
+        Each text is its own TTS cache entry, so a reading that shares units with an
+        earlier one only pays Fish for the new units.
+        """
+        clean_texts = [clean for clean in map(self.preprocess_text, texts) if clean]
+        if not clean_texts:
+            skipped = Future()
+            skipped.set_result(False)
+            return skipped
+        
+        synths = [self.tts_executor.submit(self.fish.text_to_mp3_with_cost, clean) for clean in clean_texts]
+        return self.queue_reply(chat_id, self._send_concatenated, chat_id, synths, openai_cost)
+    
+    def queue_reply(self, chat_id: int, fn, *args) -> Future:
+        """Run a Telegram send on the reply pool, after earlier replies to the same chat"""
+        return self._chain(self.reply_executor, ("reply", chat_id), fn, *args)
+    
+    def _chain(self, executor: ThreadPoolExecutor, key: Any, fn, *args) -> Future:
+        with self.dispatch_lock:
+            previous = self.dispatch_tails.get(key)
+            future = executor.submit(self._run_after, previous, fn, *args)
+            self.dispatch_tails[key] = future
+        
+        future.add_done_callback(lambda done: self._forget_tail(key, done))
+        return future
+    
+    @staticmethod
+    def _run_after(previous: Optional[Future], fn, *args):
+        # previous was submitted first to the same pool, so it is already running or finished
+        if previous is not None:
+            try:
+                previous.result()
+            except Exception:
+                pass  # Its own job logged it
+        return fn(*args)
+    
+    @staticmethod
+    def _in_session(fn, *args):
+        with db.session_scope():
+            return fn(*args)
     
-    def get_text_hash(self, text: str) -> str:
-        """Get hash for text caching"""
-        return hashlib.md5(text.encode()).hexdigest()
+    def set_state(self, user_id: int, state: str) -> None:
+        with self.state_lock:
+            self.user_states[user_id] = state
+    
+    def pop_state(self, user_id: int) -> Optional[str]:
+        """Take the user's pending state, if any, so it applies to one message only"""
+        with self.state_lock:
+            return self.user_states.pop(user_id, None)
+    
+    def _forget_tail(self, key: Any, done: Future):
+        with self.dispatch_lock:
+            if self.dispatch_tails.get(key) is done:
+                del self.dispatch_tails[key]
+    
+    @staticmethod
+    def preprocess_text(text: str) -> str:
+        """Clean text for TTS - keep only English letters, dots, and commas"""
+        return replies.preprocess_text(text)
     
     def remove_keyboard(self, chat_id: int) -> bool:
         """Remove custom keyboard"""
@@ -54,235 +178,293 @@ class TelegramBot:
         data = {
             "chat_id": chat_id,
             "text": "Keyboard removed. Use slash commands.",
-            "reply_markup": json.dumps({"remove_keyboard": True})
+            "reply_markup": _REMOVE_KEYBOARD
         }
         
         try:
-            response = requests.post(url, data=data)
+            response = self.http.post(url, data=data)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Failed to remove keyboard: {e}")
             return False
     
-    def send_voice_message(self, chat_id: int, text: str, openai_cost: float = 0.0) -> bool:
-        """Send voice message via TTS with caching and cost tracking"""
+    def _send_synthesized(self, chat_id: int, synth: Future, openai_cost: float) -> bool:
+        """Upload a clip once its background synthesis finishes"""
         try:
-            # Preprocess text
-            clean_text = self.preprocess_text(text)
-            if not clean_text:
-                return False
-            
-            fish_cost = 0.0
-            
-            # Check cache
-            text_hash = self.get_text_hash(clean_text)
-            
-            if text_hash in self.tts_cache and os.path.exists(self.tts_cache[text_hash]):
-                mp3_path = self.tts_cache[text_hash]
-                logger.info(f"Using cached TTS for: {clean_text[:50]}...")
-                # No fish cost for cached audio
-            else:
-                # Generate new MP3 and get cost
-                mp3_path, fish_cost = self.fish.text_to_mp3_with_cost(clean_text)
-                # Cache the result
-                self.tts_cache[text_hash] = mp3_path
-            
-            # Build caption with costs
-            caption = f"Fish: ${fish_cost:.4f} | OpenAI: ${openai_cost:.4f}"
-            
-            # Send voice message with caption
-            url = f"{self.base_url}/sendVoice"
-            with open(mp3_path, 'rb') as audio:
-                files = {'voice': audio}
-                data = {
-                    'chat_id': chat_id,
-                    'caption': caption
-                }
-                response = requests.post(url, data=data, files=files)
-                return response.status_code == 200
-                
+            mp3_path, fish_cost = synth.result()
+            return self._upload_voice(chat_id, mp3_path, fish_cost, openai_cost)
         except Exception as e:
             logger.error(f"Failed to send voice message: {e}")
             return False
     
-    def get_updates(self) -> List[Dict]:
-        """Get updates from Telegram"""
+    def _send_concatenated(self, chat_id: int, synths: List[Future], openai_cost: float) -> bool:
+        """Join background-synthesized clips into one and upload it"""
+        try:
+            clips = [synth.result() for synth in synths]
+            mp3_path = tts_cache.concat([path for path, _ in clips])
+            return self._upload_voice(chat_id, mp3_path, sum(cost for _, cost in clips), openai_cost)
+        except Exception as e:
+            logger.error(f"Failed to send voice message: {e}")
+            return False
+    
+    def _upload_voice(self, chat_id: int, mp3_path: str, fish_cost: float, openai_cost: float) -> bool:
+        # Build caption with costs
+        caption = f"Fish: ${fish_cost:.4f} | OpenAI: ${openai_cost:.4f}"
+        
+        # Send voice message with caption
+        url = f"{self.base_url}/sendVoice"
+        file_name = os.path.basename(mp3_path)
+        data = {
+            'chat_id': str(chat_id),
+            'caption': caption
+        }
+        
+        # Clips are content-addressed, so a path always holds the same audio
+        with self.voice_bytes_lock:
+            audio = self.voice_bytes.get(mp3_path)
+        if audio is None and os.path.getsize(mp3_path) <= VOICE_BYTES_LIMIT:
+            with open(mp3_path, 'rb') as f:
+                audio = f.read()
+            with self.voice_bytes_lock:
+                self.voice_bytes[mp3_path] = audio
+        
+        if audio is not None:
+            files = {'voice': (file_name, audio, 'audio/mpeg')}
+            response = self.http.post(url, data=data, files=files)
+            return response.status_code == 200
+        
+        # Stream large clips instead of building the whole multipart body in memory
+        with open(mp3_path, 'rb') as f:
+            encoder = MultipartEncoder(fields={**data, 'voice': (file_name, f, 'audio/mpeg')})
+            response = self.http.post(url, data=encoder, headers={'Content-Type': encoder.content_type})
+            return response.status_code == 200
+    
+    @staticmethod
+    def load_offset() -> int:
+        """Offset saved by the last run, so a restart doesn't replay handled updates"""
+        try:
+            with open(TELEGRAM_OFFSET_PATH) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            logger.warning(f"Ignoring unreadable offset file {TELEGRAM_OFFSET_PATH}")
+            return 0
+    
+    def save_offset(self) -> None:
+        """Write the offset atomically; a crash mid-write keeps the previous value"""
+        tmp_path = f"{TELEGRAM_OFFSET_PATH}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(self.offset))
+        os.replace(tmp_path, TELEGRAM_OFFSET_PATH)
+    
+    def get_updates(self) -> tuple[List[Dict], Optional[float]]:
+        """Get updates from Telegram
+        
+        Returns (updates, retry_after); retry_after is set when Telegram rate limits
+        the bot (HTTP 429). Network and other API errors are raised to the caller.
+        """
         url = f"{self.base_url}/getUpdates"
         params = {
             "offset": self.offset,
-            "timeout": 30
+            "timeout": POLL_TIMEOUT,
+            "allowed_updates": _ALLOWED_UPDATES
         }
         
-        try:
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                if data["ok"]:
-                    return data["result"]
-        except Exception as e:
-            logger.error(f"Failed to get updates: {e}")
+        response = self.http.get(url, params=params, timeout=POLL_CLIENT_TIMEOUT)
+        if response.status_code == 429:
+            data = orjson.loads(response.content)
+            return [], float(data.get("parameters", {}).get("retry_after", BACKOFF_MAX))
+        
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        if not data["ok"]:
+            raise RuntimeError(f"getUpdates failed: {data.get('description')}")
+        return data["result"], None
+    
+    def get_pending_tasks(self, limit: Optional[int] = None) -> List:
+        """Get pending micro-units ordered by priority, at most limit of them
+        
+        Returns lightweight (id, task_id, description) rows, not ORM objects.
+        """
+        from database.models import MicroUnit, Task
         
-        return []
+        query = (
+            self.task_manager.session.query(MicroUnit.id, MicroUnit.task_id, MicroUnit.description)
+            .join(Task)
+            .filter(MicroUnit.status == 'pending')
+            .filter(Task.status.in_(['pending', 'active']))
+            .order_by(Task.priority.desc(), MicroUnit.sequence_order.asc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
     
-    def get_pending_tasks(self) -> List:
-        """Get all pending micro-units ordered by priority"""
+    def get_pending_text(self, limit: Optional[int] = None) -> Optional[str]:
+        """Descriptions of the next pending units joined with ". ", built by Postgres
+        
+        The join happens in a string_agg so only one string crosses the wire.
+        """
         from database.models import MicroUnit, Task
+        from sqlalchemy import func, literal
+        from sqlalchemy.dialects.postgresql import aggregate_order_by
         
-        return (
-            self.task_manager.session.query(MicroUnit)
+        units = (
+            self.task_manager.session.query(MicroUnit.description, Task.priority, MicroUnit.sequence_order)
             .join(Task)
             .filter(MicroUnit.status == 'pending')
             .filter(Task.status.in_(['pending', 'active']))
             .order_by(Task.priority.desc(), MicroUnit.sequence_order.asc())
-            .all()
         )
+        if limit is not None:
+            units = units.limit(limit)
+        units = units.subquery()
+        
+        return self.task_manager.session.query(
+            func.string_agg(
+                units.c.description,
+                aggregate_order_by(literal('. '), units.c.priority.desc(), units.c.sequence_order.asc())
+            )
+        ).scalar()
+    
+    def get_pending_counts(self) -> tuple[int, int]:
+        """Count open tasks with pending units and their pending units in one aggregate"""
+        from database.models import MicroUnit, Task
+        from sqlalchemy import func, distinct
+        
+        task_count, unit_count = (
+            self.task_manager.session.query(func.count(distinct(MicroUnit.task_id)), func.count(MicroUnit.id))
+            .join(Task)
+            .filter(MicroUnit.status == 'pending')
+            .filter(Task.status.in_(['pending', 'active']))
+            .one()
+        )
+        return task_count, unit_count
     
     def handle_dump_command(self, chat_id: int, user_id: int) -> None:
         """Handle /dump command"""
-        self.user_states[user_id] = "waiting_for_dump"
-        self.send_voice_message(chat_id, "Send me your task dump")
+        self.set_state(user_id, "waiting_for_dump")
+        self.queue_voice_message(chat_id, "Send me your task dump")
     
     def handle_tasks_command(self, chat_id: int) -> None:
         """Handle /tasks command - show task counts"""
         try:
-            pending_units = self.get_pending_tasks()
-            
-            # Count unique tasks
-            task_ids = set()
-            for unit in pending_units:
-                task_ids.add(unit.task_id)
-            
-            task_count = len(task_ids)
-            unit_count = len(pending_units)
+            task_count, unit_count = self.get_pending_counts()
             
             if task_count == 0:
-                self.send_voice_message(chat_id, "No pending tasks")
+                self.queue_voice_message(chat_id, "No pending tasks")
             else:
                 message = f"{task_count} tasks, {unit_count} units"
-                self.send_voice_message(chat_id, message)
+                self.queue_voice_message(chat_id, message)
             
         except Exception as e:
             logger.error(f"Error getting task counts: {e}")
-            self.send_voice_message(chat_id, "Error getting task counts")
+            self.queue_voice_message(chat_id, "Error getting task counts")
     
     def handle_task_command(self, chat_id: int, count: Optional[int] = 1) -> None:
         """Handle /task command - get next task(s)"""
         try:
-            pending_units = self.get_pending_tasks()
+            if tts_cache.FFMPEG is None:
+                # Can't join clips, so speak the whole reading as one text
+                task_text = self.get_pending_text(limit=count)
+                if not task_text:
+                    self.queue_voice_message(chat_id, "No pending tasks")
+                    return
+                self.queue_voice_message(chat_id, task_text)
+                return
             
+            pending_units = self.get_pending_tasks(limit=count)
             if not pending_units:
-                self.send_voice_message(chat_id, "No pending tasks")
+                self.queue_voice_message(chat_id, "No pending tasks")
                 return
             
-            # Get the specified number of tasks
-            tasks_to_show = pending_units[:count]
-            descriptions = [unit.description for unit in tasks_to_show]
-            task_text = ". ".join(descriptions)
-            
-            self.send_voice_message(chat_id, task_text)
+            self.queue_voice_clips(chat_id, [unit.description for unit in pending_units])
             
         except Exception as e:
             logger.error(f"Error getting next task: {e}")
-            self.send_voice_message(chat_id, "Error getting next task")
+            self.queue_voice_message(chat_id, "Error getting next task")
     
     def handle_done_command(self, chat_id: int) -> None:
         """Handle /done command - complete first task and read next"""
         try:
-            pending_units = self.get_pending_tasks()
+            # The unit to complete and the one to announce next
+            pending_units = self.get_pending_tasks(limit=2)
             
             if not pending_units:
-                self.send_voice_message(chat_id, "No tasks to complete")
+                self.queue_voice_message(chat_id, "No tasks to complete")
                 return
             
             # Complete the first task
             first_task = pending_units[0]
             self.task_manager.complete_micro_unit(first_task.id, success=True)
             
-            # Get next task after completion
-            next_pending = self.get_pending_tasks()
-            
-            if next_pending:
+            # Completing one unit doesn't reorder the rest, so the next one is already known
+            if len(pending_units) > 1:
                 # Read the next task
-                next_task_text = next_pending[0].description
-                self.send_voice_message(chat_id, next_task_text)
+                next_task_text = pending_units[1].description
+                self.queue_voice_message(chat_id, next_task_text)
             else:
-                self.send_voice_message(chat_id, "No more tasks")
+                self.queue_voice_message(chat_id, "No more tasks")
             
         except Exception as e:
             logger.error(f"Error completing task: {e}")
-            self.send_voice_message(chat_id, "Error completing task")
+            self.queue_voice_message(chat_id, "Error completing task")
     
     def handle_clear_command(self, chat_id: int) -> None:
         """Handle /clear command - delete all tasks"""
         try:
-            from database.models import Task, MicroUnit, Execution
+            self.task_manager.clear_all()
             
-            # Delete in correct order to respect foreign key constraints
-            # 1. Delete executions first
-            self.task_manager.session.query(Execution).delete()
-            
-            # 2. Delete micro-units  
-            self.task_manager.session.query(MicroUnit).delete()
-            
-            # 3. Delete tasks
-            self.task_manager.session.query(Task).delete()
-            
-            self.task_manager.session.commit()
-            
-            self.send_voice_message(chat_id, "All tasks cleared")
+            self.queue_voice_message(chat_id, "All tasks cleared")
             
         except Exception as e:
             logger.error(f"Error clearing tasks: {e}")
             # Rollback on error
             self.task_manager.session.rollback()
-            self.send_voice_message(chat_id, "Error clearing tasks")
+            self.queue_voice_message(chat_id, "Error clearing tasks")
     
     def handle_tts_command(self, chat_id: int, user_id: int) -> None:
         """Handle /tts command - wait for next message to convert"""
-        self.user_states[user_id] = "waiting_for_tts"
+        self.set_state(user_id, "waiting_for_tts")
         # Don't send any response, just wait for next message
     
-    def process_dump(self, chat_id: int, user_id: int, dump_text: str) -> None:
-        """Process task dump with caching"""
+    def process_dump(self, chat_id: int, dump_text: str) -> None:
+        """Process task dump (a resent dump is answered from the database)"""
         try:
-            # Check cache first
-            dump_hash = self.get_text_hash(dump_text)
-            openai_cost = 0.0
-            
-            if dump_hash in self.dump_cache:
-                logger.info(f"Using cached dump result for: {dump_text[:50]}...")
-                results = self.dump_cache[dump_hash]
-                # No OpenAI cost for cached results
-            else:
-                self.send_voice_message(chat_id, "Processing tasks")
-                results, openai_cost = self.task_manager.process_dump_with_cost(dump_text)
-                # Cache the result
-                self.dump_cache[dump_hash] = results
+            self.queue_voice_message(chat_id, "Processing tasks")
+            results, openai_cost = self.task_manager.process_dump_with_cost(dump_text, notify_chat_id=chat_id)
+            if results["batched_tasks"]:
+                # Tasks are stored once the batch finishes; see check_batches
+                self.queue_voice_message(chat_id, f"Queued {results['batched_tasks']} tasks, I will report back when they are ready", openai_cost)
+                return
             
             if results["new_tasks"] == 0:
-                self.send_voice_message(chat_id, "No tasks could be extracted from your input", openai_cost)
+                self.queue_voice_message(chat_id, "No tasks could be extracted from your input", openai_cost)
                 return
             
             # Simple completion message
             message = f"Created {results['new_tasks']} tasks with {results['total_micro_units']} units"
-            self.send_voice_message(chat_id, message, openai_cost)
+            self.queue_voice_message(chat_id, message, openai_cost)
             
         except Exception as e:
             logger.error(f"Error processing dump: {e}")
-            self.send_voice_message(chat_id, "Error processing tasks")
-        finally:
-            # Reset state
-            self.user_states.pop(user_id, None)
+            self.queue_voice_message(chat_id, "Error processing tasks")
     
-    def process_tts_text(self, chat_id: int, user_id: int, text: str) -> None:
+    def check_batches(self) -> None:
+        """Store finished dump batches and tell their chats"""
+        for chat_id, results, openai_cost in self.task_manager.collect_finished_batches():
+            if results is None:
+                self.queue_voice_message(chat_id, "Error processing queued tasks, please dump them again")
+            else:
+                message = f"Created {results['new_tasks']} tasks with {results['total_micro_units']} units"
+                self.queue_voice_message(chat_id, message, openai_cost)
+    
+    def process_tts_text(self, chat_id: int, text: str) -> None:
         """Process text for TTS conversion"""
         try:
-            self.send_voice_message(chat_id, text)
+            self.queue_voice_message(chat_id, text)
         except Exception as e:
             logger.error(f"Error processing TTS: {e}")
-        finally:
-            # Reset state
-            self.user_states.pop(user_id, None)
     
     def handle_message(self, message: Dict[str, Any]) -> None:
         """Handle incoming message"""
@@ -291,20 +473,22 @@ class TelegramBot:
             user_id = message["from"]["id"]
             text = message.get("text", "")
             
-            # Security check: Only allow admin user
-            if int(user_id) != int(ADMIN_USER_ID):
-                logger.warning(f"Unauthorized access attempt from user {user_id}")
+            # Security check: Only allow admin users (Telegram ids are already ints)
+            if user_id not in self._admin_ids:
+                logger.warning("Unauthorized access attempt from user %s", user_id)
                 return  # Silently drop the message
             
-            # Get current user state
-            current_state = self.user_states.get(user_id)
+            # Get (and reset) current user state
+            current_state = self.pop_state(user_id)
             
             # Handle states first
             if current_state == "waiting_for_dump":
-                self.process_dump(chat_id, user_id, text)
+                # The OpenAI calls take seconds; run them as their own job so this
+                # user's later commands don't queue behind them. Dumps stay in order
+                self.dispatch(("dump", user_id), self.process_dump, chat_id, text)
                 return
             elif current_state == "waiting_for_tts":
-                self.process_tts_text(chat_id, user_id, text)
+                self.process_tts_text(chat_id, text)
                 return
             
             # Handle commands
@@ -314,9 +498,9 @@ class TelegramBot:
                 args = parts[1] if len(parts) > 1 else ""
                 
                 if command == "/start":
-                    # Remove old keyboard if it exists
-                    self.remove_keyboard(chat_id)
-                    self.send_voice_message(chat_id, "Task manager ready. Use slash dump to add tasks, slash task for next task, slash done to complete")
+                    # Remove old keyboard if it exists (sent before the voice reply below)
+                    self.queue_reply(chat_id, self.remove_keyboard, chat_id)
+                    self.queue_voice_message(chat_id, "Task manager ready. Use slash dump to add tasks, slash task for next task, slash done to complete")
                     
                 elif command == "/dump":
                     self.handle_dump_command(chat_id, user_id)
@@ -341,10 +525,10 @@ class TelegramBot:
                     self.handle_tts_command(chat_id, user_id)
                         
                 else:
-                    self.send_voice_message(chat_id, "Unknown command")
+                    self.queue_voice_message(chat_id, "Unknown command")
             else:
                 # Non-command text when not in a state
-                self.send_voice_message(chat_id, "Use slash commands")
+                self.queue_voice_message(chat_id, "Use slash commands")
                 
         except Exception as e:
             logger.error(f"Error handling message: {e}")
@@ -353,29 +537,46 @@ class TelegramBot:
         """Run bot with polling"""
         self.running = True
         logger.info("Telegram bot started polling...")
+        backoff = BACKOFF_INITIAL
         
         while self.running:
             try:
-                updates = self.get_updates()
+                updates, retry_after = self.get_updates()
+                if retry_after is not None:
+                    logger.warning(f"Rate limited by Telegram, retrying in {retry_after:.0f}s")
+                    time.sleep(retry_after)
+                    continue
+                backoff = BACKOFF_INITIAL
                 
                 for update in updates:
                     # Update offset
                     self.offset = update["update_id"] + 1
                     
-                    # Handle message
+                    # Handle message (in order per user, off the polling thread)
                     if "message" in update:
-                        self.handle_message(update["message"])
+                        message = update["message"]
+                        self.dispatch(message.get("from", {}).get("id"), self.handle_message, message)
+                
+                if updates:
+                    self.save_offset()
                 
-                # Small delay to prevent hammering
-                if not updates:
-                    time.sleep(1)
+                # getUpdates long-polls for up to POLL_TIMEOUT, so this runs at least that often
+                # A check still waiting or running would only queue another behind it
+                if time.monotonic() >= self.next_batch_check and (
+                    self.batch_check is None or self.batch_check.done()
+                ):
+                    self.next_batch_check = time.monotonic() + BATCH_CHECK_INTERVAL
+                    self.batch_check = self.dispatch("batches", self.check_batches)
                     
             except KeyboardInterrupt:
                 logger.info("Bot stopped by user")
                 break
             except Exception as e:
-                logger.error(f"Error in polling loop: {e}")
-                time.sleep(5)  # Wait before retrying
+                # Jitter keeps restarted bots from retrying in lockstep after an outage
+                delay = min(BACKOFF_MAX, backoff) + random.uniform(0, 1)
+                logger.error(f"Error in polling loop: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
+                backoff *= 2
         
         self.running = False
     
@@ -388,8 +589,12 @@ class TelegramBot:
     def stop(self) -> None:
         """Stop the bot"""
         self.running = False
+        self.executor.shutdown(wait=True)
+        self.reply_executor.shutdown(wait=True)
+        self.tts_executor.shutdown(wait=True)
         if hasattr(self, 'task_manager'):
             self.task_manager.close()
+        self.http.close()
 
 # Usage
 def create_telegram_bot():
@@ -0,0 +1,146 @@
+import hashlib
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger()
+
+# Content-addressed audio cache: same voice + text always yields the same clip
+CACHE_DIR = os.path.join('media', 'cache')
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_SWEEP_EVERY = 50  # new clips between size sweeps
+
+# Prebuilt clips for canned replies (see prebuild_tts.py); never swept
+STATIC_DIR = os.path.join('media', 'static')
+
+# Joining clips needs ffmpeg; without it callers synthesize the joined text instead
+FFMPEG = shutil.which('ffmpeg')
+
+# Process-local sequence for unique temp filenames (no clock reads, no collisions)
+_file_seq = itertools.count()
+
+_sweep_lock = threading.Lock()
+_clips_since_sweep = 0
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+def _clip_key(text: str, voice: str) -> str:
+    return hashlib.sha256(f"{voice}\0{text}".encode('utf-8')).hexdigest()
+
+def cache_path(text: str, voice: str = '') -> str:
+    """Cache location for the clip of text spoken by voice"""
+    key = _clip_key(text, voice)
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.mp3")
+
+def static_path(text: str, voice: str = '') -> str:
+    """Prebuilt location for the clip of text spoken by voice"""
+    return os.path.join(STATIC_DIR, f"{_clip_key(text, voice)}.mp3")
+
+def get_or_synth(text: str, synth_fn: Callable[[str, str], None], voice: str = '') -> tuple[str, bool]:
+    """Return (path, synthesized) for text, calling synth_fn(text, tmp_path) only on a miss"""
+    path = static_path(text, voice)
+    if os.path.exists(path):
+        return path, False
+    
+    path = cache_path(text, voice)
+    if os.path.exists(path):
+        os.utime(path)  # Mark as recently used for the sweep
+        logger.debug("Using cached TTS for: '%.50s...'", text)
+        return path, False
+    
+    _synth_to(path, text, synth_fn)
+    _count_new_clip()
+    return path, True
+
+def prebuild(text: str, synth_fn: Callable[[str, str], None], voice: str = '') -> tuple[str, bool]:
+    """Like get_or_synth, but the clip goes to STATIC_DIR where the sweep never removes it"""
+    path = static_path(text, voice)
+    if os.path.exists(path):
+        return path, False
+    
+    _synth_to(path, text, synth_fn)
+    return path, True
+
+def concat(paths: List[str]) -> str:
+    """Cached clip playing paths back to back, joined by ffmpeg without re-encoding"""
+    if len(paths) == 1:
+        return paths[0]
+    
+    key = hashlib.sha256('\0'.join(paths).encode('utf-8')).hexdigest()
+    path = os.path.join(CACHE_DIR, key[:2], f"{key}.concat.mp3")
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    
+    list_path = os.path.join('media', f'{next(_file_seq)}_{os.getpid()}.concat.txt')
+    with open(list_path, 'w') as f:
+        f.writelines(f"file '{os.path.abspath(p)}'\n" for p in paths)
+    
+    def join(_text: str, tmp_path: str):
+        subprocess.run(
+            [FFMPEG, '-nostdin', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+             '-i', list_path, '-c', 'copy', '-f', 'mp3', '-y', tmp_path],
+            check=True
+        )
+    
+    try:
+        _synth_to(path, '', join)
+    finally:
+        os.remove(list_path)
+    
+    _count_new_clip()
+    return path
+
+def _synth_to(path: str, text: str, synth_fn: Callable[[str, str], None]):
+    tmp_path = os.path.join('media', f'{next(_file_seq)}_{os.getpid()}.mp3.tmp')
+    try:
+        synth_fn(text, tmp_path)
+        # Publish atomically so readers never see a half-written clip
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _count_new_clip():
+    global _clips_since_sweep
+    with _sweep_lock:
+        _clips_since_sweep += 1
+        if _clips_since_sweep < CACHE_SWEEP_EVERY:
+            return
+        _clips_since_sweep = 0
+    sweep(CACHE_MAX_BYTES)
+
+def sweep(max_bytes: int = CACHE_MAX_BYTES):
+    """Delete least recently used clips until the cache fits in max_bytes"""
+    entries = []
+    total = 0
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_atime, st.st_size, path))
+            total += st.st_size
+    
+    if total <= max_bytes:
+        return
+    
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= max_bytes:
+            break
+    
+    logger.info(f"TTS cache swept down to {total:,} bytes")
@@ -1,30 +1,140 @@
 import logging
 import os
+from contextlib import contextmanager
 
-from common.config import DB_CFG
-from database.models import Base
+from common.config import settings
+from database.models import Base, Task, MicroUnit, PendingBatch
 
 from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 
 logger = logging.getLogger()
 
+# Sized for the bot's update workers (8) plus headroom for batch checks
+POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 4
+POOL_RECYCLE = 1800  # seconds; below typical server/PgBouncer idle timeouts
+
 class Database:
     def __init__(self):
         
-        self.connection_string = "postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}".format(**DB_CFG)
-        self.engine = create_engine(self.connection_string, echo=False)
+        self.connection_string = settings.database_url
+        self.engine = create_engine(
+            self.connection_string,
+            echo=False,
+            pool_size=POOL_SIZE,
+            max_overflow=POOL_MAX_OVERFLOW,
+            pool_pre_ping=True,  # Replace connections the server dropped while idle
+            pool_recycle=POOL_RECYCLE,
+            pool_use_lifo=True  # Reuse the most recent connection, let the rest idle out
+        )
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        # Thread-local sessions; each unit of work gets a fresh one via session_scope()
+        self.Session = scoped_session(self.SessionLocal)
     
     def create_tables(self):
         """Create all tables defined in models"""
         Base.metadata.create_all(bind=self.engine)
         logger.info("Database tables created successfully")
+        self.apply_migrations()
+    
+    def apply_migrations(self):
+        """Apply idempotent schema changes to existing databases"""
+        try:
+            with self.engine.connect() as conn:
+                # Priority components, stored once so scheduling never re-asks the model
+                conn.execute(text("""
+                    ALTER TABLE tasks
+                    ADD COLUMN IF NOT EXISTS leverage INTEGER,
+                    ADD COLUMN IF NOT EXISTS control INTEGER,
+                    ADD COLUMN IF NOT EXISTS urgency INTEGER;
+                """))
+                
+                # Denormalized count of unfinished units, backfilled once when added
+                has_pending_units = conn.execute(text("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'tasks' AND column_name = 'pending_units';
+                """)).first()
+                if not has_pending_units:
+                    conn.execute(text("""
+                        ALTER TABLE tasks ADD COLUMN pending_units INTEGER NOT NULL DEFAULT 0;
+                        UPDATE tasks SET pending_units = (
+                            SELECT COUNT(*) FROM micro_units m
+                            WHERE m.task_id = tasks.id AND m.status IN ('pending', 'active')
+                        );
+                    """))
+                
+                # Dedup hashes; existing tasks are hashed once, keeping only the oldest
+                # open copy of duplicated content so the unique index can be built
+                has_content_hash = conn.execute(text("""
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'tasks' AND column_name = 'content_hash';
+                """)).first()
+                if not has_content_hash:
+                    conn.execute(text("""
+                        ALTER TABLE tasks
+                        ADD COLUMN content_hash VARCHAR(32),
+                        ADD COLUMN IF NOT EXISTS dump_hash VARCHAR(32);
+                        UPDATE tasks SET content_hash = md5(content)
+                        WHERE status NOT IN ('pending', 'active') OR id IN (
+                            SELECT MIN(id) FROM tasks
+                            WHERE status IN ('pending', 'active')
+                            GROUP BY md5(content)
+                        );
+                    """))
+                conn.execute(text("""
+                    ALTER TABLE pending_batches ADD COLUMN IF NOT EXISTS dump_hash VARCHAR(32);
+                """))
+                
+                # Deleting a task removes its units, executions and embedding in the database
+                for table, column, target in (
+                    ("micro_units", "task_id", "tasks"),
+                    ("executions", "micro_unit_id", "micro_units"),
+                    ("task_embeddings", "task_id", "tasks"),
+                ):
+                    name = f"{table}_{column}_fkey"
+                    cascades = conn.execute(
+                        text("SELECT confdeltype = 'c' FROM pg_constraint WHERE conname = :name"),
+                        {"name": name}
+                    ).scalar()
+                    if cascades is False:
+                        conn.execute(text(f"""
+                            ALTER TABLE {table}
+                            DROP CONSTRAINT {name},
+                            ADD CONSTRAINT {name} FOREIGN KEY ({column})
+                                REFERENCES {target}(id) ON DELETE CASCADE;
+                        """))
+                
+                # Indexes are declared on the models; create any an older database lacks
+                for table in (Task.__table__, MicroUnit.__table__, PendingBatch.__table__):
+                    for index in table.indexes:
+                        index.create(bind=conn, checkfirst=True)
+                
+                conn.commit()
+                logger.info("Database migrations applied")
+        except Exception as e:
+            logger.error(f"Failed to apply migrations: {e}")
     
     def get_session(self):
         """Get a database session"""
         return self.SessionLocal()
     
+    @contextmanager
+    def session_scope(self):
+        """Run one unit of work in this thread's session, then discard the session
+        
+        Commits on success and rolls back on error, so nothing outlives the block.
+        """
+        session = self.Session()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            self.Session.remove()
+    
     def test_connection(self):
         """Test database connection"""
         try:
@@ -70,6 +180,12 @@ class Database:
                     FOR EACH ROW EXECUTE FUNCTION update_task_search_vector();
                 """))
                 
+                # Rows from before the trigger existed
+                conn.execute(text("""
+                    UPDATE tasks SET search_vector = to_tsvector('english', COALESCE(content, ''))
+                    WHERE search_vector IS NULL;
+                """))
+                
                 conn.commit()
                 logger.info("Full-text search enabled")
         except Exception as e:
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey, JSON, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -12,13 +12,30 @@ class Task(Base):
     id = Column(Integer, primary_key=True)
     content = Column(Text, nullable=False)
     status = Column(String(20), default='pending')  # pending, active, complete, archived
-    priority = Column(Integer, default=0)
+    priority = Column(Integer, default=0)  # leverage + control + urgency
+    leverage = Column(Integer)  # 0-40
+    control = Column(Integer)  # 0-30
+    urgency = Column(Integer)  # 0-30
+    pending_units = Column(Integer, nullable=False, default=0, server_default='0')  # Units not yet complete
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     task_metadata = Column(JSON, default=dict)
+    dump_hash = Column(String(32), index=True)  # md5 of the dump the task came from
+    content_hash = Column(String(32))  # md5(content), unique among open tasks
     
     # Relationships
-    micro_units = relationship("MicroUnit", back_populates="task", cascade="all, delete-orphan")
+    micro_units = relationship("MicroUnit", back_populates="task", cascade="all, delete-orphan", passive_deletes=True)
+    embedding = relationship("TaskEmbedding", back_populates="task", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('ix_tasks_priority', priority.desc()),
+        # Open tasks by priority
+        Index('ix_tasks_status_priority', status, priority.desc(),
+              postgresql_where=status.in_(['pending', 'active'])),
+        # The same task can't be open twice
+        Index('uq_tasks_open_content_hash', content_hash, unique=True,
+              postgresql_where=status.in_(['pending', 'active'])),
+    )
     
     def __repr__(self):
         return f"<Task(id={self.id}, content='{self.content[:50]}...', status='{self.status}')>"
@@ -27,7 +44,7 @@ class MicroUnit(Base):
     __tablename__ = 'micro_units'
     
     id = Column(Integer, primary_key=True)
-    task_id = Column(Integer, ForeignKey('tasks.id'), nullable=False)
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'), nullable=False)
     description = Column(Text, nullable=False)
     sequence_order = Column(Integer, nullable=False)
     status = Column(String(20), default='pending')  # pending, active, complete, skipped
@@ -38,7 +55,15 @@ class MicroUnit(Base):
     
     # Relationships
     task = relationship("Task", back_populates="micro_units")
-    executions = relationship("Execution", back_populates="micro_unit", cascade="all, delete-orphan")
+    executions = relationship("Execution", back_populates="micro_unit", cascade="all, delete-orphan", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('ix_micro_units_status_task_seq', status, task_id, sequence_order),
+        # Pending units in task order, covering the /tasks and /task queries
+        Index('ix_mu_pending_priority', task_id, sequence_order,
+              postgresql_include=['description'],
+              postgresql_where=status == 'pending'),
+    )
     
     def mark_complete(self, actual_minutes=None):
         self.status = 'complete'
@@ -53,7 +78,7 @@ class Execution(Base):
     __tablename__ = 'executions'
     
     id = Column(Integer, primary_key=True)
-    micro_unit_id = Column(Integer, ForeignKey('micro_units.id'), nullable=False)
+    micro_unit_id = Column(Integer, ForeignKey('micro_units.id', ondelete='CASCADE'), nullable=False)
     started_at = Column(DateTime, default=func.now())
     completed_at = Column(DateTime)
     notes = Column(Text)
@@ -63,4 +88,29 @@ class Execution(Base):
     micro_unit = relationship("MicroUnit", back_populates="executions")
     
     def __repr__(self):
-        return f"<Execution(id={self.id}, micro_unit_id={self.micro_unit_id}, success={self.success})>"
\ No newline at end of file
+        return f"<Execution(id={self.id}, micro_unit_id={self.micro_unit_id}, success={self.success})>"
+
+class TaskEmbedding(Base):
+    __tablename__ = 'task_embeddings'
+    
+    task_id = Column(Integer, ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True)
+    vector = Column(LargeBinary, nullable=False)  # L2-normalized float32 embedding
+    
+    # Relationships
+    task = relationship("Task", back_populates="embedding")
+    
+    def __repr__(self):
+        return f"<TaskEmbedding(task_id={self.task_id}, dims={len(self.vector) // 4})>"
+
+class PendingBatch(Base):
+    __tablename__ = 'pending_batches'
+    
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(String(64), nullable=False, unique=True)  # OpenAI Batch API job id
+    chat_id = Column(BigInteger, nullable=False)  # Where to report the result
+    parsed_tasks = Column(JSON, nullable=False)
+    dump_hash = Column(String(32), index=True)  # Stamped on the tasks once stored
+    created_at = Column(DateTime, default=func.now())
+    
+    def __repr__(self):
+        return f"<PendingBatch(id={self.id}, batch_id='{self.batch_id}', tasks={len(self.parsed_tasks)})>"
\ No newline at end of file
@@ -0,0 +1,22 @@
+import logging
+
+from common.fish import FishClient
+from common.replies import CANNED_REPLIES, preprocess_text
+
+logger = logging.getLogger()
+
+def main():
+    """Synthesize the bot's canned replies into the static clip store"""
+    fish = FishClient()
+    total_cost = 0.0
+    
+    for text in CANNED_REPLIES:
+        # Same cleanup as the bot applies, so the clip keys match at runtime
+        path, cost = fish.prebuild_mp3_with_cost(preprocess_text(text))
+        total_cost += cost
+        logger.info(f"{'Built' if cost else 'Kept'} {path} for: '{text[:50]}'")
+    
+    logger.info(f"Prebuilt {len(CANNED_REPLIES)} canned replies for ${total_cost:.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,20 @@
 import logging
 import sys
 from common.telegram import create_telegram_bot
+from database.database import db
 
 logger = logging.getLogger(__name__)
 
 def main():
     """Main entry point"""
+    bot = None
     try:
         logger.info("🔪 Starting Dexter's Task Hunter Bot...")
         
+        # Create missing tables and bring older databases up to the current schema
+        db.create_tables()
+        db.enable_full_text_search()
+        
         # Create and start bot
         bot = create_telegram_bot()
         
@@ -17,11 +23,13 @@ def main():
         
     except KeyboardInterrupt:
         logger.info("🛑 Bot stopped by user")
-        if 'bot' in locals():
-            bot.stop()
     except Exception as e:
         logger.error(f"❌ Fatal error: {e}")
         sys.exit(1)
+    finally:
+        # Let queued handlers and voice replies finish before closing the session
+        if bot is not None:
+            bot.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file